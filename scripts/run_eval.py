@@ -1,3 +1,4 @@
+import sys
 import yaml
 import fire
 from orby.digitalagent.utils import file_utils
@@ -13,8 +14,16 @@ def main(
     subprocess: bool = False,
     max_ips: int = -1,
 ):
-    with file_utils.open(yaml_path, "r") as f:
-        config = EvalConfig(**yaml.safe_load(f.read()))
+    if yaml_path == "-":
+        # The elastic client pipes the config in as JSON
+        content = sys.stdin.read()
+    else:
+        with file_utils.open(yaml_path, "r") as f:
+            content = f.read()
+    if yaml_path == "-" or yaml_path.endswith(".json"):
+        config = EvalConfig.model_validate_json(content)
+    else:
+        config = EvalConfig(**yaml.safe_load(content))
     if subprocess and (elastic_client or docker_client):
         raise ValueError(
             "subprocess is a part of elastic_client and docker_client, they cannot be used together."
@@ -37,6 +46,7 @@ def main(
         results = eval_runner.run_eval(config)
     print(results)
     print(results.to_json())
+    eval_runner.wait_for_metrics_reporting()
 
 
 if __name__ == "__main__":
@@ -81,6 +81,9 @@ class Agent(metaclass=LoggingMetaWrapper):
         self.model_configs = kwargs.get("model_configs", {})
         self.html_history: List[str] = []
         self.screenshot_history: List[Any] = []
+        # Whether each observation differs from the next one, filled lazily by the prompts
+        self._screenshot_diff_cache: List[bool] = []
+        self._html_diff_cache: List[bool] = []
         self.goal: str = ""
         self.trace: List[Any] = []
         # Field will be modified by meta class. !! Do not use
@@ -160,6 +163,8 @@ class Agent(metaclass=LoggingMetaWrapper):
         self.actions = state_dict["actions"]
         self.html_history = state_dict["html_history"]
         self.screenshot_history = state_dict["screenshot_history"]
+        self._screenshot_diff_cache = []
+        self._html_diff_cache = []
         self.goal = state_dict["goal"]
         self.goal_images = state_dict["goal_images"]
         self.trace = state_dict["trace"]
@@ -23,6 +23,8 @@ class BasicStatelessFMAgent(Agent):
         ]
         self.html_history = [html]
         self.screenshot_history = [screenshot]
+        self._screenshot_diff_cache = []
+        self._html_diff_cache = []
 
     def update(self, html, screenshot, trace):
         self.trace = trace
@@ -24,6 +24,8 @@ class HierarchicalStatelessFMAgent(Agent):
         ]
         self.html_history = [html]
         self.screenshot_history = [screenshot]
+        self._screenshot_diff_cache = []
+        self._html_diff_cache = []
 
     def update(self, html, screenshot, trace):
         self.trace = trace
@@ -34,6 +34,8 @@ class HierarchicalStatelessFMGroundingAgent(Agent):
         ]
         self.html_history = [html]
         self.screenshot_history = [screenshot]
+        self._screenshot_diff_cache = []
+        self._html_diff_cache = []
         self.trace = []
 
     def update(self, html, screenshot, trace):
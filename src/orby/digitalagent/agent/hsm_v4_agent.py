@@ -173,7 +173,7 @@ class _ExecutorAgent(Agent):
         """
         Check whether the action is a vision-only action.
         """
-        for vision_action_type in COORDINATE_ACTIONS + MULTI_COORDINATE_ACTIONS:
+        for vision_action_type in COORDINATE_ACTIONS | MULTI_COORDINATE_ACTIONS:
             if action.startswith(vision_action_type):
                 return True
         return False
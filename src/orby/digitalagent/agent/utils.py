@@ -4,8 +4,12 @@ import random
 import re
 from typing import List, Dict
 import warnings
+import weakref
+import xxhash
 
-from orby.digitalagent.utils.image_utils import numpy_to_base64
+from PIL import Image
+
+from orby.digitalagent.utils.image_utils import convert_pil_image_to_base64_str
 from fm import llm_data_pb2
 
 # TODO: make sure removing the \n\n from the user delimiter works for sva_v3
@@ -13,17 +17,62 @@ HUMAN_DELIMITER = "\n\nHuman:"
 ASSISTANT_DELIMITER = "\n\nAssistant:"
 
 
-def prepare_image_input(arr):
+def prepare_image_input(image, image_format="PNG", **save_kwargs):
+    """
+    Build an image_url content item from an RGB numpy array or a PIL image.
+    PIL images are encoded directly, without a round-trip through numpy.
+
+    Args:
+    image_format (str): format to encode the image in, e.g. "PNG" or "JPEG".
+    **save_kwargs: options of the image format, e.g. quality=85 for JPEG.
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image, mode="RGB")
+    image_base64 = convert_pil_image_to_base64_str(image, image_format, **save_kwargs)
     return {
         "type": "image_url",
-        "image_url": {"url": f"data:image/png;base64,{numpy_to_base64(arr)}"},
+        "image_url": {
+            "url": f"data:image/{image_format.lower()};base64,{image_base64}"
+        },
     }
 
 
+# id of a live read-only screenshot array -> 128-bit hash of its pixels, dropped when the array is freed
+_screenshot_digests: dict[int, int] = {}
+
+
+def _is_read_only(array: np.ndarray) -> bool:
+    """Whether the pixels of an array cannot be modified, through it or any array it is a view of."""
+    while isinstance(array, np.ndarray):
+        if array.flags.writeable:
+            return False
+        array = array.base
+    return True
+
+
+def _screenshot_digest(screenshot: np.ndarray) -> int:
+    """
+    Hash the pixels of a read-only screenshot, once per array.
+    Its pixels cannot change, so the hash stays valid for the lifetime of the array.
+    """
+    key = id(screenshot)
+    digest = _screenshot_digests.get(key)
+    if digest is None:
+        digest = xxhash.xxh3_128_intdigest(np.ascontiguousarray(screenshot))
+        _screenshot_digests[key] = digest
+        weakref.finalize(screenshot, _screenshot_digests.pop, key, None)
+    return digest
+
+
 def screenshots_differ(screenshot1, screenshot2):
-    return (screenshot1.shape != screenshot2.shape) or (
-        screenshot1 != screenshot2
-    ).any()
+    if screenshot1.shape != screenshot2.shape:
+        return True
+    if _is_read_only(screenshot1) and _is_read_only(screenshot2):
+        # comparing cached hashes instead of pixels makes repeated comparisons of the same
+        # read-only screenshots, e.g. when a trajectory is re-scored by several evaluators, O(1)
+        return _screenshot_digest(screenshot1) != _screenshot_digest(screenshot2)
+    # a writeable screenshot may have changed since it was last compared
+    return not np.array_equal(screenshot1, screenshot2)
 
 
 def prompt_to_messages(
@@ -32,11 +81,14 @@ def prompt_to_messages(
     user_delimiter: str = HUMAN_DELIMITER,
     assistant_delimiter: str = ASSISTANT_DELIMITER,
     images: dict[str, np.ndarray] = {},
+    image_format: str = "PNG",
+    image_save_kwargs: dict = {},
 ) -> list[dict]:
     """
     Converts a prompt string into a list of messages for the user and assistant.
 
     The user prompt can contain images and text, where images are specified as <image_KEY>, where KEY is a key in the images dictionary.
+    Images are encoded in image_format, with the format options in image_save_kwargs, e.g. {"quality": 85} for JPEG or WEBP.
 
     If the prompt does not start with the user delimiter, the first part of the prompt before the user delimiter is considered a system prompt.
     """
@@ -53,7 +105,9 @@ def prompt_to_messages(
                 continue
             if part.startswith("<image:") and part.endswith(">"):
                 key = part[len("<image:") : -1]
-                user_content.append(prepare_image_input(images[key]))
+                user_content.append(
+                    prepare_image_input(images[key], image_format, **image_save_kwargs)
+                )
                 image_keys_unused.discard(key)
             else:
                 user_content.append({"type": "text", "text": part})
@@ -3,9 +3,12 @@ Module that runs evaluations specified in a config.
 """
 
 from datetime import datetime
+import functools
+import gc
 import importlib
-import io
+import itertools
 from joblib import Parallel, delayed
+import orjson
 import os
 import pandas as pd
 import random
@@ -13,10 +16,8 @@ import string
 import subprocess
 import sys
 import time
-import tempfile
-from typing import Callable, Optional
+from typing import Callable, Iterator, Optional
 import urllib
-import yaml
 from collections import defaultdict
 
 import browsergym.core  # register the openended task as a gym environment
@@ -45,7 +46,7 @@ from orby.digitalagent.evaluation.eval_metrics import (
 )
 from orby.digitalagent.agent import ENV_CONFIGS
 from orby.digitalagent.model.fm import FoundationModel
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 
 def resolve_attr(full_path):
@@ -483,9 +484,9 @@ def _divide_eval_config(full_config: EvalConfig) -> list[EvalConfig]:
     Returns:
         list[EvalConfig]: The list of divided configs
     """
-    template_config = deepcopy(full_config)
-    template_config.benchmarks = {}
-    template_config.agents = {}
+    # Divided configs only ever replace top-level fields, so they can share the
+    # remaining (runner, model_configs) sub-models with the full config
+    template_config = full_config.model_copy(update={"benchmarks": {}, "agents": {}})
 
     all_raw_benchmarks = deepcopy(full_config.benchmarks)
     # Split each benchmark into multiple benchmarks if tasks_per_batch is specified, and assign example_ids and names to each
@@ -518,72 +519,75 @@ def _divide_eval_config(full_config: EvalConfig) -> list[EvalConfig]:
 
     # We ensure that in each divided config, there is only one run.
     # We do this by making each divided config have a single benchmark, agent, and model config.
-    divided_configs = []
-    for benchmark_id, benchmark_config in all_benchmarks.items():
-        for agent_name, agent_config in all_agents.items():
-            template_agent_config = deepcopy(agent_config)
-            template_agent_config.model = None
-            template_agent_config.model_config_name = None
-            template_agent_config.model_config_names = None
-
-            for model_config_name in agent_config.model_config_names:
-                new_config = deepcopy(template_config)
-                new_config.benchmarks[benchmark_id] = benchmark_config
-                new_config.agents[agent_name] = deepcopy(template_agent_config)
-                new_config.agents[agent_name].model_config_name = model_config_name
-
-                divided_configs.append(new_config)
-    return divided_configs
+    # model_copy skips validation, which matters when there are many combinations.
+    agent_model_pairs = [
+        (
+            agent_name,
+            agent_config.model_copy(
+                update={
+                    "model": None,
+                    "model_config_name": model_config_name,
+                    "model_config_names": None,
+                }
+            ),
+        )
+        for agent_name, agent_config in all_agents.items()
+        for model_config_name in agent_config.model_config_names
+    ]
+    return [
+        template_config.model_copy(
+            update={
+                "benchmarks": {benchmark_id: benchmark_config},
+                "agents": {agent_name: agent_config.model_copy()},
+            }
+        )
+        for (benchmark_id, benchmark_config), (agent_name, agent_config) in (
+            itertools.product(all_benchmarks.items(), agent_model_pairs)
+        )
+    ]
 
 
 def _create_all_wa_service_instances_multithreads(
     num_instances: int,
     max_worker: int = None,
     ttl_hours: int = None,
-) -> tuple[list[str], list[str]]:
+) -> Iterator[tuple[str, str, Callable[[], None]]]:
     """
-    Creates the specified number of WA service instances and returns their public IPs.
-    We do this in a distributed manner to speed up the process.
+    Creates the specified number of WA service instances and yields each one as soon as it is ready.
+    We do this in a distributed manner to speed up the process, so callers can start using the
+    first instances while the rest are still booting.
 
     Args:
         num_instances (int): The number of instances to create
 
-    Returns:
-        tuple[list[str], list[str]]: The instance IDs, public IPs, and callback functions of the created instances
+    Yields:
+        tuple[str, str, Callable[[], None]]: The instance ID, public IP, and release callback of each created instance
     """
 
-    instance_ids = []
-    public_ips = []
-
     # TODO: consider consolidating code by using
     # orby/digitalagent/utils/joblib_parallel_with_tqdm.py
     with ThreadPoolExecutor(max_workers=max_worker) as executor:
         # Submitting tasks to the thread pool
-        future_to_instance_id = {}
-        for i in range(num_instances):
-            future_to_instance_id[
-                executor.submit(wa_service.create_instance, ttl_hours=ttl_hours)
-            ] = i
+        futures = [
+            executor.submit(wa_service.create_instance, ttl_hours=ttl_hours)
+            for _ in range(num_instances)
+        ]
 
-        # Collecting the results as they are completed
+        # Yielding the results as they are completed
         with tqdm(total=num_instances) as pbar:
-            for future in as_completed(future_to_instance_id):
+            for future in as_completed(futures):
+                pbar.update(1)
                 try:
                     instance_id, public_ip = future.result()
-                    instance_ids.append(instance_id)
-                    public_ips.append(public_ip)
                 except Exception as e:
                     print(
                         f"Exception occurred during WA environment creation: {e}",
                         file=sys.stderr,
                     )
-                pbar.update(1)
-
-    instance_release_callbacks = [
-        lambda: wa_service.release_instance(instance_id)
-        for instance_id in range(len(instance_ids))
-    ]
-    return instance_ids, public_ips, instance_release_callbacks
+                    continue
+                yield instance_id, public_ip, functools.partial(
+                    wa_service.release_instance, instance_id
+                )
 
 
 def _setup_and_run_all_eval_runs(
@@ -675,10 +679,49 @@ def _setup_and_run_all_eval_runs(
     return pd.DataFrame(results_rows)
 
 
+# W&B reporting is network bound, so it runs in the background and callers get the
+# aggregated results right away. wandb runs are process-global, so a single worker
+# keeps reports from overlapping with each other.
+_wandb_executor = ThreadPoolExecutor(max_workers=1)
+_pending_wandb_reports: list[Future] = []
+
+
+def wait_for_metrics_reporting() -> None:
+    """Blocks until all background W&B reports have finished, re-raising their exceptions."""
+    while _pending_wandb_reports:
+        _pending_wandb_reports.pop(0).result()
+
+
+def _report_aggregated_metrics_to_wandb(
+    aggregated: pd.DataFrame,
+    full_eval_config: EvalConfig,
+):
+    for (agent, model), agent_model_data in aggregated.groupby(["agent", "model"]):
+        # Start recording for the unique agent
+        start_recording(
+            name=f"metrics_recording_{full_eval_config.run_id}_{agent}_{model}",
+            agent_name=f"{agent}_{model}",
+            agent_config=full_eval_config.agents[agent],
+            model_config=full_eval_config.model_configs[model],
+            runner_config=full_eval_config.runner,
+            benchmarks={},
+        )
+        metrics = {
+            f"{row['benchmark']}/SR": row["score"]
+            for _, row in agent_model_data.iterrows()
+        }
+        report_metrics(metrics)
+        finish_recording()
+
+
 def aggregate_results_and_report_metrics_to_wandb(
     results: pd.DataFrame,
     full_eval_config: EvalConfig,
 ):
+    """
+    Aggregates the results per (benchmark, agent, model) and reports the scores to W&B.
+    The report is submitted in the background; use wait_for_metrics_reporting to wait for it.
+    """
     # Check for duplicates
     duplicates = results.duplicated(
         subset=["benchmark", "agent", "model", "benchmark_id"]
@@ -694,23 +737,11 @@ def aggregate_results_and_report_metrics_to_wandb(
     aggregated["score"] = aggregated["num_success"] / aggregated["num_total"]
     aggregated.sort_values(by=["benchmark", "agent", "model"], inplace=True)
 
-    for (agent, model), agent_model_data in aggregated.groupby(["agent", "model"]):
-        # Start recording for the unique agent
-        start_recording(
-            name=f"metrics_recording_{full_eval_config.run_id}_{agent}_{model}",
-            agent_name=f"{agent}_{model}",
-            agent_config=full_eval_config.agents[agent],
-            model_config=full_eval_config.model_configs[model],
-            runner_config=full_eval_config.runner,
-            benchmarks={},
+    _pending_wandb_reports.append(
+        _wandb_executor.submit(
+            _report_aggregated_metrics_to_wandb, aggregated.copy(), full_eval_config
         )
-        metrics = {
-            f"{row['benchmark']}/SR": row["score"]
-            for _, row in agent_model_data.iterrows()
-        }
-        report_metrics(metrics)
-        finish_recording()
-
+    )
     return aggregated
 
 
@@ -741,6 +772,8 @@ def run_eval(
     config: EvalConfig,
 ) -> pd.DataFrame:
 
+    # Earlier reports must not overlap with the recordings (or forks) of this run
+    wait_for_metrics_reporting()
     _validate_and_initialize_eval_config(config)
     print(
         f"Now running evaluations for {config.run_name} with unique id {config.run_id}..."
@@ -766,6 +799,8 @@ def run_eval_with_wa_service(
     Returns:
         pd.DataFrame: The results of the evaluation
     """
+    # Earlier reports must not overlap with the recordings (or forks) of this run
+    wait_for_metrics_reporting()
     _validate_and_initialize_eval_config(config)
 
     # fix the reset_env flag for benchmarks
@@ -784,51 +819,51 @@ def run_eval_with_wa_service(
         max_ips = len(configs)
 
     # Run them in batches of max_ips
-    result_df = pd.DataFrame()
+    result_frames = []
     start_idx = 0
     while start_idx < len(configs):
         stop_idx = min(start_idx + max_ips, len(configs))
-        config_batch = configs[start_idx:stop_idx]
-        num_instances = len(config_batch)
+        num_instances = stop_idx - start_idx
 
-        # Start the same number of WA service instances as the number of runs needed
+        # Start the same number of WA service instances as the number of runs needed,
+        # and dispatch each run as soon as its instance is ready
         print("Create {} EC2 instances".format(num_instances))
-        (
-            instance_ids,
-            public_ips,
-            instance_release_callbacks,
-        ) = _create_all_wa_service_instances_multithreads(
-            num_instances=num_instances,
-            max_worker=config.runner.threads,
-            ttl_hours=config.runner.environment_ttl_hours,
-        )
+        num_runs = 0
+        for _, public_ip, instance_release_callback in (
+            _create_all_wa_service_instances_multithreads(
+                num_instances=num_instances,
+                max_worker=config.runner.threads,
+                ttl_hours=config.runner.environment_ttl_hours,
+            )
+        ):
+            config_idx = start_idx + num_runs
+            print(f"Now running evaluation {config_idx + 1}/{len(configs)}...")
+            result_frames.append(
+                _setup_and_run_all_eval_runs(
+                    [configs[config_idx]],
+                    [public_ip],
+                    [instance_release_callback],
+                )
+            )
+            num_runs += 1
 
-        if len(instance_ids) == 0:
+        if num_runs == 0:
             # If no instance was created, raise an error
             raise ValueError("No instance was successfully created!")
-        elif len(instance_ids) < len(config_batch):
-            # If some of the instances were not created, only run the number of instances created
-            # Leave the rest for the next evaluation batch
-            len_config_batch = len(instance_ids)
+        elif num_runs < num_instances:
+            # If some of the instances were not created, leave the rest for the next evaluation batch
             print(
-                "Number of instances created does not match the number of runs. Only running {} trials.".format(
-                    len_config_batch
+                "Number of instances created does not match the number of runs. Only ran {} trials.".format(
+                    num_runs
                 )
             )
-            stop_idx = start_idx + len_config_batch
-            config_batch = configs[start_idx:stop_idx]
-            print("Now running evaluation {} to {}".format(start_idx, stop_idx))
-
-        # Run each config with the corresponding WA service instance, and collect the results
-        print("Now running evaluations...")
-        result_df_batch = _setup_and_run_all_eval_runs(
-            config_batch,
-            public_ips,
-            instance_release_callbacks,
-        )
-        result_df = pd.concat([result_df, result_df_batch], ignore_index=True)
         # Move to the next batch
-        start_idx = stop_idx
+        start_idx += num_runs
+    result_df = pd.concat(result_frames, ignore_index=True, copy=False)
+    # Drop the per-batch frames so only the concatenated frame stays alive
+    result_frames.clear()
+    del result_frames
+    gc.collect()
     if subprocess:
         print("Finished running evaluations in subprocess.")
         return result_df
@@ -838,50 +873,121 @@ def run_eval_with_wa_service(
     return aggregated_df
 
 
-def _run_single_eval_with_elastic_client(config, use_docker=False):
-    with tempfile.NamedTemporaryFile(mode="w") as f:
-        yaml.dump(config.dict(), f)
-        f.flush()
+_EVAL_CLIENT_IMAGE = "eval_client"
+_EVAL_CLIENT_OWNER_LABEL = "orby.eval_client.owner_pid"
+# Long-lived eval_client container owned by the current worker process
+_eval_client_container: str | None = None
 
-        if use_docker:
-            command = [
+
+def _get_eval_client_container(owner_pid: int) -> str:
+    """
+    Returns the eval_client container of the current worker process, starting it on first use.
+    Trials are run in it with `docker exec`, which avoids paying the container
+    create/start/remove overhead of `docker run` on every trial.
+
+    Args:
+        owner_pid (int): PID of the process that dispatched the trials and removes the containers afterwards
+    """
+    global _eval_client_container
+    if _eval_client_container is None:
+        container_name = f"{_EVAL_CLIENT_IMAGE}_{owner_pid}_{os.getpid()}"
+        subprocess.run(
+            [
                 "docker",
                 "run",
-                "-v",
-                f"{f.name}:/digital-agent/run.yaml",
+                "-d",
+                "--rm",
+                "--name",
+                container_name,
+                "--label",
+                f"{_EVAL_CLIENT_OWNER_LABEL}={owner_pid}",
                 "-e",
                 f"OPENAI_API_KEY={os.environ.get('OPENAI_API_KEY', '')}",
                 "-e",
                 "MINIWOB_URL=file:///digital-agent/dependencies/miniwob-plusplus/miniwob/html/miniwob/",
-                "-t",
-                "eval_client",
-                "python",
-                "scripts/run_eval.py",
-                "run.yaml",
-                "-u",
-                "-s",
-            ]
-        else:
-            command = ["python", "scripts/run_eval.py", f.name, "-u", "-s"]
-
-        proc = subprocess.run(
-            command,
+                _EVAL_CLIENT_IMAGE,
+                "tail",
+                "-f",
+                "/dev/null",
+            ],
+            check=True,
             capture_output=True,
-            text=True,
         )
+        _eval_client_container = container_name
+    return _eval_client_container
+
+
+def _remove_eval_client_containers() -> None:
+    """Removes the eval_client containers started on behalf of this process."""
+    global _eval_client_container
+    _eval_client_container = None
+    proc = subprocess.run(
+        [
+            "docker",
+            "ps",
+            "-aq",
+            "--filter",
+            f"label={_EVAL_CLIENT_OWNER_LABEL}={os.getpid()}",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    container_ids = proc.stdout.split()
+    if container_ids:
+        subprocess.run(["docker", "rm", "-f", *container_ids], capture_output=True)
 
-        # read last line of logs to get the result
+
+def _run_single_eval_with_elastic_client(config, use_docker=False, owner_pid=None):
+    # The config is piped to scripts/run_eval.py as JSON through stdin, so no
+    # temporary file (or volume mount) is needed per trial.
+    if use_docker:
         try:
-            result = proc.stdout.splitlines()[-1]
-            print(result)
-            return pd.read_json(io.StringIO(result))
-        except Exception as e:
-            import traceback
-
-            print(f"Error: {e}", file=sys.stderr)
-            print(traceback.format_exc(), file=sys.stderr)
-            print(proc.stderr, file=sys.stderr)
+            container = _get_eval_client_container(owner_pid)
+        except subprocess.CalledProcessError as e:
+            # A failed trial must not abort the other trials of the run
+            print(
+                f"Error: could not start the eval_client container: {e}",
+                file=sys.stderr,
+            )
+            print(e.stderr, file=sys.stderr)
             return pd.DataFrame()
+        command = [
+            "docker",
+            "exec",
+            "-i",
+            container,
+            "python",
+            "scripts/run_eval.py",
+            "-",
+            "-u",
+            "-s",
+        ]
+    else:
+        command = ["python", "scripts/run_eval.py", "-", "-u", "-s"]
+
+    proc = subprocess.run(
+        command,
+        input=config.model_dump_json(),
+        capture_output=True,
+        text=True,
+    )
+
+    # read last line of logs to get the result
+    try:
+        result = proc.stdout.splitlines()[-1]
+        print(result)
+        # The subprocess prints DataFrame.to_json(), i.e. {column: {index: value}}
+        records = orjson.loads(result)
+        if isinstance(records, list):
+            return pd.DataFrame.from_records(records)
+        return pd.DataFrame.from_dict(records)
+    except Exception as e:
+        import traceback
+
+        print(f"Error: {e}", file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        print(proc.stderr, file=sys.stderr)
+        return pd.DataFrame()
 
 
 def run_eval_with_elastic_client(
@@ -898,6 +1004,8 @@ def run_eval_with_elastic_client(
         pd.DataFrame: The results of the evaluation
     """
 
+    # Earlier reports must not overlap with the recordings (or forks) of this run
+    wait_for_metrics_reporting()
     _validate_and_initialize_eval_config(config)
     # Divide up the config specs into multiple configs, each with a single run
     configs = _divide_eval_config(config)
@@ -905,11 +1013,21 @@ def run_eval_with_elastic_client(
     if max_ips is None or max_ips < 0:
         max_ips = len(configs)
     # Run them in batches of max_ips
-    result_dfs = Parallel(n_jobs=max_ips, backend="multiprocessing")(
-        delayed(_run_single_eval_with_elastic_client)(single_config, use_docker)
-        for single_config in configs
-    )
-    result_df = pd.concat(result_dfs, ignore_index=True)
+    try:
+        result_dfs = Parallel(n_jobs=max_ips, backend="multiprocessing")(
+            delayed(_run_single_eval_with_elastic_client)(
+                single_config, use_docker, os.getpid()
+            )
+            for single_config in configs
+        )
+    finally:
+        if use_docker:
+            _remove_eval_client_containers()
+    result_df = pd.concat(result_dfs, ignore_index=True, copy=False)
+    # Drop the per-run frames so only the concatenated frame stays alive
+    result_dfs.clear()
+    del result_dfs
+    gc.collect()
     aggregated_df = aggregate_results_and_report_metrics_to_wandb(result_df, config)
     print("All Done!")
     return aggregated_df
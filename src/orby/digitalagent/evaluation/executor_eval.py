@@ -5,14 +5,19 @@ WARNING:
 - Results can fluctuate, especially action description ROUGE F1. Mutliple run is adviced during actual usage.
 """
 
-from typing import Any, Type
+from typing import Any, Callable, Type
 from tqdm import tqdm
 import ast
 import concurrent.futures as cf
-import copy
 import dataclasses
+import functools
+import multiprocessing
+import os
+import re
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from orby.protos.fm.action_data_pb2 import WebState
 from orby.digitalagent.agent import Agent
@@ -22,6 +27,103 @@ import orby.digitalagent.utils.action_parsing_utils as ap_utils
 import orby.digitalagent.utils.image_utils as image_utils
 
 
+# Number of finished dataset points per row group when writing the results
+_RESULT_ROW_GROUP_SIZE = 1024
+
+# Strings in the datasets that represent None
+_NONE_STRING_PATTERN = re.compile(r"(?i)^(nan|none)$")
+
+# Output columns holding Python lists, which may mix value types, so they are
+# stored as their string representation in parquet
+_LIST_OUTPUT_COLUMNS = {"predicted_bids", "predicted_coordinates", "predicted_value"}
+
+# Columns written by evaluate_executor for every dataset point
+_OUTPUT_COLUMNS = [
+    "predicted_action",
+    "predicted_bids",
+    "predicted_coordinates",
+    "predicted_value",
+    "predicted_action_description",
+    "error",
+]
+
+
+class _ResultWriter:
+    """
+    Writes evaluation results to a parquet file in row groups as dataset points finish,
+    so results are persisted during the run instead of in a single write at the end.
+    Rows are written in completion order. Does nothing if no path is given.
+    """
+
+    def __init__(
+        self,
+        path: str | None,
+        dataset: pd.DataFrame,
+        outputs: dict[str, np.ndarray],
+        row_group_size: int = _RESULT_ROW_GROUP_SIZE,
+    ):
+        self._outputs = outputs
+        self._row_group_size = row_group_size
+        self._pending_positions = []
+        self._writer = None
+        if not path:
+            return
+        self._inputs = dataset.drop(columns=_OUTPUT_COLUMNS, errors="ignore")
+        # Fix the schema upfront, since a single row group may only contain None for some columns
+        schema = pa.Schema.from_pandas(self._inputs, preserve_index=False)
+        for column in _OUTPUT_COLUMNS:
+            schema = schema.append(pa.field(column, pa.string()))
+        self._schema = schema
+        self._writer = pq.ParquetWriter(
+            path,
+            schema,
+            compression="zstd",
+            compression_level=3,
+            use_dictionary=True,
+        )
+
+    def __enter__(self) -> "_ResultWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, pos: int) -> None:
+        """Mark the dataset point at the given position as finished."""
+        if self._writer is None:
+            return
+        self._pending_positions.append(pos)
+        if len(self._pending_positions) >= self._row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the finished dataset points as one row group."""
+        if self._writer is None or not self._pending_positions:
+            return
+        positions = self._pending_positions
+        batch = self._inputs.iloc[positions].assign(
+            **{
+                column: (
+                    [str(v) if v is not None else None for v in values[positions]]
+                    if column in _LIST_OUTPUT_COLUMNS
+                    else values[positions]
+                )
+                for column, values in self._outputs.items()
+            }
+        )
+        self._writer.write_table(
+            pa.Table.from_pandas(batch, schema=self._schema, preserve_index=False)
+        )
+        self._pending_positions = []
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._writer = None
+
+
 @dataclasses.dataclass
 class ExecutorOutput:
     """
@@ -73,6 +175,7 @@ def evaluate_executor(
     additional_executor_act_kwargs: dict[str, Any] = {},
     display_pbar: bool = True,
     verbose: bool = True,
+    use_processes: bool = False,
 ) -> tuple[list[pd.DataFrame], list[ExecutorEvaluationStatistics]]:
     """
     Evaluate a provided model and executor agent on a list of single-step success rate datasets.
@@ -96,78 +199,88 @@ def evaluate_executor(
             If None or < 0, the number of workers will be set to the minimum between the number of CPU cores and 32.
             Defaults to -1.
         display_pbar (bool, optional): Whether to display a progress bar. Defaults to True.
+        use_processes (bool, optional): Whether to run the executor in a process pool instead of a thread pool.
+            Useful when the executor is CPU bound (e.g. local models); keep threads for executors calling remote APIs.
+            The executor class, model configs, and additional kwargs must be picklable.
+            Defaults to False.
 
     Returns:
         list[pd.DataFrame]: A list of DataFrames containing the evaluation results.
         list[ExecutorEvaluationStatistics]: A list containing the evaluation statistics.
     """
     max_workers = max_workers if max_workers and max_workers > 0 else None
-    # datasets are deepcopied
+    # datasets are copied, so the provided DataFrames are not modified
     datasets = _prepare_datasets(dataset)
 
     output_datasets = []
     output_statistics = []
 
+    # output_dir may be an S3 URI, which pathlib would mangle, so join it as a string
+    result_path_template = (
+        os.path.join(output_dir, "evaluation_result_{counter}.parquet")
+        if output_dir
+        else None
+    )
     counter = 0
     for _ in range(num_runs):
         for _, dataset in enumerate(datasets):
-            dataset = copy.deepcopy(dataset)
-            with tqdm(total=len(dataset), disable=not display_pbar) as pbar:
-                with cf.ThreadPoolExecutor(max_workers=max_workers) as thread:
+            # Each run only assigns whole output columns, so a shallow copy is enough
+            # to keep the runs apart without copying the web states
+            dataset = dataset.copy(deep=False)
+            # Collect the outputs per column and assign them in bulk afterwards,
+            # instead of writing single cells with .loc for every finished future
+            positions = {name: i for i, name in enumerate(dataset.index)}
+            outputs = {
+                column: np.empty(len(dataset), dtype=object) for column in _OUTPUT_COLUMNS
+            }
+            result_path = (
+                result_path_template.format(counter=counter) if output_dir else None
+            )
+            with tqdm(
+                total=len(dataset), disable=not display_pbar
+            ) as pbar, _ResultWriter(result_path, dataset, outputs) as result_writer:
+                with _create_pool(max_workers, use_processes) as pool:
                     futures = {
-                        thread.submit(
+                        pool.submit(
                             run_executor_on_single_dp,
                             executor_cls=executor_cls,
                             model_configs=model_configs,
-                            goal=dataset.loc[row.name, "goal"],
-                            action_hints=dataset.loc[row.name, "action_hints"],
-                            web_state_bytes=dataset.loc[row.name, "web_state"],
-                            strict_action_format=dataset.loc[row.name, "strict"],
+                            goal=row.goal,
+                            action_hints=row.action_hints,
+                            web_state_bytes=row.web_state,
+                            strict_action_format=row.strict,
                             additional_executor_class_kwargs=additional_executor_class_kwargs,
                             additional_executor_act_kwargs=additional_executor_act_kwargs,
-                        ): row
-                        for _, row in dataset.iterrows()
+                        ): row.Index
+                        for row in dataset.itertuples(index=True)
                     }
                     for future in cf.as_completed(futures):
-                        row = futures[future]
+                        pos = positions[futures[future]]
                         try:
                             result = future.result()
-                            dataset.loc[row.name, "predicted_action"] = (
+                            outputs["predicted_action"][pos] = (
                                 result.browsergym_action_info.action_type
                             )
-                            dataset.loc[row.name, "predicted_bids"] = (
-                                str(result.browsergym_action_info.bids)
-                                if result.browsergym_action_info.bids is not None
-                                else None
+                            # Lists are kept as Python objects and only stringified
+                            # when the results are written to parquet
+                            outputs["predicted_bids"][pos] = (
+                                result.browsergym_action_info.bids
                             )
-                            dataset.loc[row.name, "predicted_coordinates"] = (
-                                str(result.browsergym_action_info.absolute_coordinates)
-                                if result.browsergym_action_info.absolute_coordinates
-                                is not None
-                                else None
+                            outputs["predicted_coordinates"][pos] = (
+                                result.browsergym_action_info.absolute_coordinates
                             )
-                            dataset.loc[row.name, "predicted_value"] = str(
+                            outputs["predicted_value"][pos] = (
                                 result.browsergym_action_info.value
                             )
-                            dataset.loc[row.name, "predicted_action_description"] = (
+                            outputs["predicted_action_description"][pos] = (
                                 result.action_description
                             )
-                            dataset.loc[row.name, "error"] = None
                         except Exception as e:
-                            dataset.loc[row.name, "predicted_action"] = None
-                            dataset.loc[row.name, "predicted_bids"] = None
-                            dataset.loc[row.name, "predicted_coordinates"] = None
-                            dataset.loc[row.name, "predicted_value"] = None
-                            dataset.loc[row.name, "predicted_action_description"] = None
-                            dataset.loc[row.name, "error"] = str(e)
+                            outputs["error"][pos] = str(e)
+                        result_writer.add(pos)
                         pbar.update(1)
-
-            if output_dir:
-                dataset.to_parquet(
-                    output_dir
-                    + ("" if output_dir[-1] == "/" else "/")
-                    + f"evaluation_result_{counter}.parquet"
-                )
+            for column, values in outputs.items():
+                dataset[column] = values
 
             statistics = _calculate_statistics(dataset)
             if verbose:
@@ -221,6 +334,20 @@ def evaluate_executor(
     return output_datasets, output_statistics
 
 
+def _create_pool(max_workers: int | None, use_processes: bool) -> cf.Executor:
+    """
+    Create the pool to run the executor in.
+    Processes sidestep the GIL for CPU-heavy executors; forkserver avoids forking
+    the parent's threads and open connections into the workers.
+    """
+    if use_processes:
+        return cf.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return cf.ThreadPoolExecutor(max_workers=max_workers)
+
+
 def run_executor_on_single_dp(
     executor_cls: Type[Agent],
     model_configs: dict[str, Any],
@@ -246,13 +373,15 @@ def run_executor_on_single_dp(
         ExecutorOutput: The output of the executor agent.
     """
     # Get observations from the web state
-    web_state = WebState.FromString(web_state_bytes)
+    web_state = _parse_web_state(web_state_bytes)
     html_str = dom_utils.html_to_string(web_state.root_element)
     screenshot_array = image_utils.convert_image_bytes_to_numpy(
         web_state.viewport.screenshot.content
     )
 
-    # Create and run the executor agent
+    # Get and run the executor agent
+    # Executors hold per-task state that reset() does not always clear, so every dataset point gets
+    # a new one. Constructing it is cheap: model weights, processors and HTTP clients are cached per process.
     executor = executor_cls(
         model_configs=model_configs,
         actions=action_hints,
@@ -284,6 +413,17 @@ def run_executor_on_single_dp(
     )
 
 
+@functools.lru_cache(maxsize=64)
+def _parse_web_state(web_state_bytes: bytes) -> WebState:
+    """
+    Parse a serialized web state, reusing recent results.
+    The same bytes are parsed when filling in GT bounding boxes and again in every run,
+    and bytes objects cache their hash, so lookups are cheap.
+    The returned proto is shared and must not be modified.
+    """
+    return WebState.FromString(web_state_bytes)
+
+
 def fill_in_coordinates(
     browsergym_action_info: ap_utils.BrowserGymActionInfo, web_state: WebState
 ) -> ap_utils.BrowserGymActionInfo:
@@ -298,26 +438,15 @@ def fill_in_coordinates(
         ap_utils.BrowserGymActionInfo: The action info with the coordinates filled in.
     """
     browsergym_action_info.absolute_coordinates = []
+    bid_index = _make_bid_index(web_state)
     for bid in browsergym_action_info.bids:
-        element = dom_utils.find_element_by_bid(web_state.root_element, bid)
+        element = bid_index.get(bid)
         if element is not None:
             center_point = (
                 element.bounding_box.x + element.bounding_box.width / 2,
                 element.bounding_box.y + element.bounding_box.height / 2,
             )
             browsergym_action_info.absolute_coordinates.append(center_point)
-        else:
-            # We put some faith in the annotation and assume that the reason we can't find the element
-            # is because it is recorded with bid in the node.id field, instead of as an attribute
-            element = dom_utils.find_element_by_bid(
-                web_state.root_element, bid, bid_location="id"
-            )
-            if element is not None:
-                center_point = (
-                    element.bounding_box.x + element.bounding_box.width / 2,
-                    element.bounding_box.y + element.bounding_box.height / 2,
-                )
-                browsergym_action_info.absolute_coordinates.append(center_point)
     if browsergym_action_info.absolute_coordinates == []:
         # We couldn't find any element with the given bids
         # We set the coordinates to (-1, -1) to indicate this
@@ -328,65 +457,62 @@ def fill_in_coordinates(
 
 def _calculate_statistics(dataset: pd.DataFrame) -> ExecutorEvaluationStatistics:
     # Calculate action accuracy
-    num_correct_actions = 0
-    for _, row in dataset.iterrows():
-        predicted_action = row["predicted_action"]
-        alternative_predicted_action = ""
-        if not row["strict"]:
-            alternative_predicted_action = ap_utils.get_alternative_action(
-                predicted_action
-            )
-        if (
-            row["action_type"] == predicted_action
-            or row["action_type"] == alternative_predicted_action
-        ):
-            num_correct_actions += 1
+    predicted_actions = dataset["predicted_action"]
+    # The alternative action is only accepted if we do not enforce strict action format.
+    # There are only a handful of distinct actions, so look each one up once.
+    alternative_actions = {
+        action: ap_utils.get_alternative_action(action)
+        for action in predicted_actions.unique()
+    }
+    alternative_predicted_actions = predicted_actions.map(alternative_actions).where(
+        ~dataset["strict"].astype(bool), ""
+    )
+    num_correct_actions = int(
+        (
+            (dataset["action_type"] == predicted_actions)
+            | (dataset["action_type"] == alternative_predicted_actions)
+        ).sum()
+    )
     action_accuracy = num_correct_actions / len(dataset)
 
-    # Calculate element accuracy
+    # Calculate element accuracy and action description ROUGE score
+    # These need per-row Python logic, so they share a single pass over the rows.
+    # The element columns are parsed once instead of in every comparison.
     num_correct_bid_elements = 0
     num_all_bid_elements = 0
     num_correct_coordinate_elements = 0
     num_all_coordinate_elements = 0
-    for _, row in dataset.iterrows():
-        # There is a special case where the GT does not contain any element
-        # specification, which means that if the prediction contains any
-        # element specification, it is incorrect.
-        if row["bids"] is None and row["bboxes"] is None:
-            if (
-                row["predicted_bids"] is not None
-                or row["predicted_coordinates"] is not None
-            ):
-                # We prioritize the bid specification over the coordinate specification
-                num_all_bid_elements += 1
-        else:
-            if row["strict"]:
-                # If we are enforcing strict element format, we prioritize the
-                # bid specification over the coordinate specification.
-                # We assume there are only 2 situations:
-                # 1. The GT contains only bbox
-                # 2. The GT contains only bids at first, and we filled in the
-                #    bbox for the GT previously
-                if row["bids"] is not None:
-                    num_all_bid_elements += 1
-                    if _correct_bids(row):
-                        num_correct_bid_elements += 1
-                elif row["bboxes"] is not None:
-                    num_all_coordinate_elements += 1
-                    if _correct_coordinates(row):
-                        num_correct_coordinate_elements += 1
-            else:
-                # If we are not enforcing strict element format, we mark either
-                # one type of element specification as correct if the GT exist
-                # and the prediction is correct.
-                if _correct_bids(row):
-                    num_all_bid_elements += 1
-                    num_correct_bid_elements += 1
-                elif _correct_coordinates(row):
-                    num_all_coordinate_elements += 1
-                    num_correct_coordinate_elements += 1
-                else:
-                    num_all_bid_elements += 1
+    total_rouge_score = 0.0
+    for (
+        strict,
+        bids,
+        bboxes,
+        predicted_bids,
+        predicted_coordinates,
+        predicted_action_description,
+        action_description,
+    ) in zip(
+        dataset["strict"].to_numpy(),
+        _literal_eval_column(dataset["bids"]).to_numpy(),
+        _literal_eval_column(dataset["bboxes"]).to_numpy(),
+        _literal_eval_column(dataset["predicted_bids"]).to_numpy(),
+        _literal_eval_column(dataset["predicted_coordinates"]).to_numpy(),
+        dataset["predicted_action_description"].to_numpy(),
+        dataset["action_description"].to_numpy(),
+    ):
+        element_type, correct = _evaluate_element(
+            strict, bids, bboxes, predicted_bids, predicted_coordinates
+        )
+        if element_type == "bid":
+            num_all_bid_elements += 1
+            num_correct_bid_elements += correct
+        elif element_type == "coordinate":
+            num_all_coordinate_elements += 1
+            num_correct_coordinate_elements += correct
+        total_rouge_score += ag_utils.rouge_1_f1_metric(
+            predicted_action_description, action_description
+        )
+    action_description_average_rouge_score = total_rouge_score / len(dataset)
 
     if num_all_bid_elements > 0:
         bid_accuracy = num_correct_bid_elements / num_all_bid_elements
@@ -406,37 +532,23 @@ def _calculate_statistics(dataset: pd.DataFrame) -> ExecutorEvaluationStatistics
         element_accuracy = None
 
     # Calculate value accuracy
-    num_correct_values = 0
-    num_actions_with_values = 0
-    for _, row in dataset.iterrows():
-        if row["value"] is not None:
-            num_actions_with_values += 1
-
-            if (
-                row["predicted_value"] is None
-                or row["predicted_value"] == "None"
-                or row["predicted_value"] == ""
-            ):
-                continue
-            predicted_value = str(ast.literal_eval(row["predicted_value"])[0])
-            if (
-                row["value"].replace(" ", "").strip().lower()
-                == predicted_value.replace(" ", "").strip().lower()
-            ):
-                num_correct_values += 1
+    values = dataset["value"]
+    predicted_values = dataset["predicted_value"]
+    has_value = values.notna()
+    num_actions_with_values = int(has_value.sum())
+    first_predicted_values = predicted_values[has_value].map(_first_predicted_value)
+    has_predicted_value = first_predicted_values.notna()
+    num_correct_values = int(
+        (
+            _normalize_values(values[has_value][has_predicted_value])
+            == _normalize_values(first_predicted_values[has_predicted_value])
+        ).sum()
+    )
     if num_actions_with_values > 0:
         value_accuracy = num_correct_values / num_actions_with_values
     else:
         value_accuracy = None
 
-    # Calculate action description ROUGE score
-    action_description_average_rouge_score = dataset.apply(
-        lambda row: ag_utils.rouge_1_f1_metric(
-            row["predicted_action_description"], row["action_description"]
-        ),
-        axis=1,
-    ).sum() / len(dataset)
-
     return ExecutorEvaluationStatistics(
         n=len(dataset),
         action_accuracy=action_accuracy,
@@ -457,20 +569,92 @@ def _calculate_statistics(dataset: pd.DataFrame) -> ExecutorEvaluationStatistics
     )
 
 
-def _correct_bids(row: pd.Series) -> bool:
+def _first_predicted_value(predicted_value: list | str | None) -> str | None:
+    """
+    Get the first predicted value as a string, or None if there is no predicted value.
+    Accepts both the list kept in memory and its string representation read from parquet.
+    """
+    if isinstance(predicted_value, str):
+        if predicted_value in ("", "None"):
+            return None
+        predicted_value = ast.literal_eval(predicted_value)
+    if not predicted_value:
+        return None
+    return str(predicted_value[0])
+
+
+def _normalize_values(values: pd.Series) -> pd.Series:
+    """
+    Normalize values for comparison by removing spaces and lowercasing them.
+    """
+    return values.astype(str).str.replace(" ", "", regex=False).str.strip().str.lower()
+
+
+def _literal_eval_column(column: pd.Series) -> pd.Series:
+    """
+    Parse a column of stringified Python literals, keeping None and already parsed values as is.
+    """
+    return column.map(
+        lambda value: ast.literal_eval(value) if isinstance(value, str) else value
+    )
+
+
+def _evaluate_element(
+    strict: bool,
+    bids: list | None,
+    bboxes: list | None,
+    predicted_bids: list | None,
+    predicted_coordinates: list | None,
+) -> tuple[str | None, bool]:
+    """
+    Evaluate the predicted element of a single dataset point.
+
+    Returns:
+        str | None: The type of element specification the dataset point is counted under,
+            "bid" or "coordinate", or None if it is not counted.
+        bool: Whether the predicted element is correct.
+    """
+    # There is a special case where the GT does not contain any element
+    # specification, which means that if the prediction contains any
+    # element specification, it is incorrect.
+    if bids is None and bboxes is None:
+        if predicted_bids is not None or predicted_coordinates is not None:
+            # We prioritize the bid specification over the coordinate specification
+            return "bid", False
+        return None, False
+
+    if strict:
+        # If we are enforcing strict element format, we prioritize the
+        # bid specification over the coordinate specification.
+        # We assume there are only 2 situations:
+        # 1. The GT contains only bbox
+        # 2. The GT contains only bids at first, and we filled in the
+        #    bbox for the GT previously
+        if bids is not None:
+            return "bid", _correct_bids(bids, predicted_bids)
+        return "coordinate", _correct_coordinates(bboxes, predicted_coordinates)
+
+    # If we are not enforcing strict element format, we mark either
+    # one type of element specification as correct if the GT exist
+    # and the prediction is correct.
+    if _correct_bids(bids, predicted_bids):
+        return "bid", True
+    if _correct_coordinates(bboxes, predicted_coordinates):
+        return "coordinate", True
+    return "bid", False
+
+
+def _correct_bids(bids: list | None, predicted_bids: list | None) -> bool:
     """
     Check if the predicted bids are correct.
     """
     # If both the GT and the prediction are None, we consider it correct
-    if row["bids"] is None and row["predicted_bids"] is None:
+    if bids is None and predicted_bids is None:
         return True
     # If one of the GT or the prediction is None, the prediction must be incorrect
-    if row["bids"] is None or row["predicted_bids"] is None:
+    if bids is None or predicted_bids is None:
         return False
 
-    bids = ast.literal_eval(row["bids"])
-    predicted_bids = ast.literal_eval(row["predicted_bids"])
-
     # If the number of predicted bids is different from the number of GT bids, something is wrong
     if len(bids) != len(predicted_bids):
         return False
@@ -485,17 +669,17 @@ def _correct_bids(row: pd.Series) -> bool:
     return True
 
 
-def _correct_coordinates(row: pd.Series) -> bool:
+def _correct_coordinates(
+    bboxes: list | None, predicted_coordinates: list | None
+) -> bool:
     """
     Check if the predicted coordinates are correct.
     """
-    if row["bboxes"] is None and row["predicted_coordinates"] is None:
+    if bboxes is None and predicted_coordinates is None:
         return True
-    if row["bboxes"] is None or row["predicted_coordinates"] is None:
+    if bboxes is None or predicted_coordinates is None:
         return False
 
-    bboxes = ast.literal_eval(row["bboxes"])
-    predicted_coordinates = ast.literal_eval(row["predicted_coordinates"])
     # If the number of predicted coordinates is different from the number of
     # GT bounding boxes, we consider it incorrect
     if len(bboxes) != len(predicted_coordinates):
@@ -528,35 +712,38 @@ def _prepare_datasets(
     Args:
         dataset (str | pd.DataFrame | list[str] | list[pd.DataFrame]): The dataset(s) to create.
             If a string, it must be the path to one parquet file. The dataset will be loaded from the specified path.
-            If a DataFrame, it will be deepcopied and used as is.
+            If a DataFrame, it will be copied and used as is.
             If a list of strings, each string must be the path to one parquet file. The datasets will be loaded from the specified paths.
-            If a list of DataFrames, each DataFrame will be deepcopied and used as is.
+            If a list of DataFrames, each DataFrame will be copied and used as is.
 
     Returns:
         list[pd.DataFrame]: A list of datasets.
     """
     # Get the dataset into the correct format
-    datasets = []
-    if isinstance(dataset, str):
-        dataset = pd.read_parquet(dataset)
-        datasets.append(dataset)
-    elif isinstance(dataset, pd.DataFrame):
-        datasets.append(dataset)
-    elif isinstance(dataset, list):
-        for d in dataset:
-            if isinstance(d, str):
-                datasets.append(pd.read_parquet(d))
-            elif isinstance(d, pd.DataFrame):
-                datasets.append(d)
-    else:
+    if isinstance(dataset, (str, pd.DataFrame)):
+        dataset = [dataset]
+    elif not isinstance(dataset, list):
         raise ValueError(
             "dataset must be a string, a DataFrame, or a list of strings or DataFrames"
         )
+    dataset = [d for d in dataset if isinstance(d, (str, pd.DataFrame))]
+
+    # Reading parquet files is I/O bound (and often remote), so read them concurrently
+    paths = [d for d in dataset if isinstance(d, str)]
+    with cf.ThreadPoolExecutor(max_workers=min(len(paths), 16) or 1) as pool:
+        loaded = iter(pool.map(pd.read_parquet, paths))
+    datasets = [next(loaded) if isinstance(d, str) else d.copy() for d in dataset]
 
     # Preemtively replace all values that represent None with None
     for dataset in datasets:
-        dataset.replace(r"(?i)^(nan|none)$", None, regex=True, inplace=True)
-        dataset.replace(np.nan, None, inplace=True)
+        # Only object columns can hold the "nan" / "none" strings
+        object_columns = dataset.select_dtypes(include="object").columns
+        dataset[object_columns] = dataset[object_columns].replace(
+            _NONE_STRING_PATTERN, None, regex=True
+        )
+        # Only columns with missing values need their NaNs replaced
+        nan_columns = dataset.columns[dataset.isna().any()]
+        dataset[nan_columns] = dataset[nan_columns].replace(np.nan, None)
 
     # if any web_state is a string, convert it to bytes
     for dataset in datasets:
@@ -566,60 +753,129 @@ def _prepare_datasets(
 
     # Fill in the bounding box of each ground truth element if it is missing
     for dataset in datasets:
-        for i, row in dataset.iterrows():
-            # Sometimes row["bboxes"] or row["bid"] is a numpy nd.array
-            # We need to convert it to a string
-            if isinstance(row["bboxes"], np.ndarray):
-                dataset.loc[i, "bboxes"] = (
-                    str(row["bboxes"]).replace("array(", "").replace(")", "")
-                )
-            if isinstance(row["bids"], np.ndarray):
-                dataset.loc[i, "bids"] = (
-                    str(row["bids"]).replace("array(", "").replace(")", "")
+        # Sometimes the bboxes or bids are numpy nd.arrays (e.g. list columns in parquet)
+        # We need to convert them to strings
+        for column in ("bboxes", "bids"):
+            is_array = dataset[column].map(lambda value: isinstance(value, np.ndarray))
+            if is_array.any():
+                dataset.loc[is_array, column] = dataset.loc[is_array, column].map(
+                    lambda value: str(_ndarray_to_list(value))
                 )
 
-            if not row["strict"] and row["bboxes"] is None and row["bids"] is not None:
-                # We only do this conversion if we do not require strict action format
-                # and the bounding box is missing but the bids are present
-                bboxes = []
-                for bid in ast.literal_eval(row["bids"]):
-                    ws = WebState.FromString(row["web_state"])
-                    # It is possible that each bid is a list of multiple valid bids
-                    # In this case we also create a list of valid bounding boxes
-                    if isinstance(bid, list):
-                        bbox_options = []
-                        for b in bid:
-                            bbox = _find_bbox_of_bid(b, ws)
-                            if bbox is not None:
-                                bbox_options.append(bbox)
-                        if bbox_options:
-                            bboxes.append(bbox_options)
-                    else:
-                        bbox = _find_bbox_of_bid(bid, ws)
-                        if bbox is not None:
-                            bboxes.append(bbox)
-                if bboxes:
-                    dataset.loc[i, "bboxes"] = str(bboxes)
-                else:
-                    # If we couldn't find the bounding box of any bid
-                    # we have no choice but to set strict to True
-                    dataset.loc[i, "strict"] = True
+        # We only fill in the bounding boxes if we do not require strict action format
+        # and the bounding box is missing but the bids are present
+        needs_bboxes = (
+            ~dataset["strict"].astype(bool)
+            & dataset["bboxes"].isna()
+            & dataset["bids"].notna()
+        )
+        if not needs_bboxes.any():
+            continue
+        all_bboxes = _map_cpu_bound(
+            _find_bboxes_of_bids,
+            dataset.loc[needs_bboxes, "bids"].tolist(),
+            dataset.loc[needs_bboxes, "web_state"].tolist(),
+        )
+        dataset.loc[needs_bboxes, "bboxes"] = [
+            str(bboxes) if bboxes else None for bboxes in all_bboxes
+        ]
+        # If we couldn't find the bounding box of any bid
+        # we have no choice but to set strict to True
+        dataset.loc[needs_bboxes, "strict"] = [not bboxes for bboxes in all_bboxes]
 
     return datasets
 
 
-def _find_bbox_of_bid(bid: str, ws: WebState) -> list[int] | None:
+def _ndarray_to_list(value: Any) -> Any:
+    """
+    Recursively convert a (possibly nested) numpy array into Python lists and scalars.
+    """
+    if isinstance(value, np.ndarray):
+        return [_ndarray_to_list(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _map_cpu_bound(fn: Callable, *iterables: list) -> list:
+    """
+    Map a CPU-bound function over the given lists, using a process pool when there
+    are enough items to amortize the cost of starting the workers.
+    """
+    num_workers = os.cpu_count() or 1
+    if num_workers == 1 or len(iterables[0]) < num_workers * 8:
+        return list(map(fn, *iterables))
+    with cf.ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("forkserver"),
+    ) as pool:
+        return list(pool.map(fn, *iterables, chunksize=32))
+
+
+def _find_bboxes_of_bids(bids: str, web_state_bytes: bytes) -> list:
+    """
+    Find the bounding boxes of the GT elements with the given bids.
+
+    Args:
+        bids (str): The stringified list of bids. Each bid can also be a list of valid bids.
+        web_state_bytes (bytes): The serialized web state to search for the elements in.
+
+    Returns:
+        list: The bounding boxes of the elements that were found. If a bid is a list of
+            valid bids, the corresponding entry is a list of valid bounding boxes.
+    """
+    bboxes = []
+    bid_index = _make_bid_index(_parse_web_state(web_state_bytes))
+    for bid in ast.literal_eval(bids):
+        # It is possible that each bid is a list of multiple valid bids
+        # In this case we also create a list of valid bounding boxes
+        if isinstance(bid, list):
+            bbox_options = []
+            for b in bid:
+                bbox = _find_bbox_of_bid(b, bid_index)
+                if bbox is not None:
+                    bbox_options.append(bbox)
+            if bbox_options:
+                bboxes.append(bbox_options)
+        else:
+            bbox = _find_bbox_of_bid(bid, bid_index)
+            if bbox is not None:
+                bboxes.append(bbox)
+    return bboxes
+
+
+def _make_bid_index(ws: WebState) -> dict[str, Any]:
+    """
+    Create a mapping from bid to element for the web state, walking the DOM once per bid location.
+
+    Args:
+        ws (fm.action_data_pb2.WebState): The web state to index.
+
+    Returns:
+        dict[str, Any]: A mapping from bid to element. Bids recorded as attributes take precedence.
+    """
+    bid_index = dom_utils.make_bid_element_map(ws.root_element)
+    # We put some faith in the annotation and assume that the reason we can't find the element
+    # is because it is recorded with bid in the node.id field, instead of as an attribute
+    for bid, element in dom_utils.make_bid_element_map(
+        ws.root_element, bid_location="id"
+    ).items():
+        bid_index.setdefault(bid, element)
+    return bid_index
+
+
+def _find_bbox_of_bid(bid: str, bid_index: dict[str, Any]) -> list[int] | None:
     """
     Find the bounding box of the element with the given bid.
 
     Args:
         bid (str): The bid of the element.
-        ws (fm.action_data_pb2.WebState): The web state to search for the element in.
+        bid_index (dict[str, Any]): The bid to element mapping of the web state, see _make_bid_index.
 
     Returns:
         list[int] | None: The bounding box of the element, or None if the element is not found.
     """
-    element = dom_utils.find_element_by_bid(ws.root_element, bid)
+    element = bid_index.get(bid)
     if element is not None:
         return [
             element.bounding_box.x,
@@ -627,15 +883,4 @@ def _find_bbox_of_bid(bid: str, ws: WebState) -> list[int] | None:
             element.bounding_box.width,
             element.bounding_box.height,
         ]
-    else:
-        # We put some faith in the annotation and assume that the reason we can't find the element
-        # is because it is recorded with bid in the node.id field, instead of as an attribute
-        element = dom_utils.find_element_by_bid(ws.root_element, bid, bid_location="id")
-        if element is not None:
-            return [
-                element.bounding_box.x,
-                element.bounding_box.y,
-                element.bounding_box.width,
-                element.bounding_box.height,
-            ]
     return None
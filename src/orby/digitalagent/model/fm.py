@@ -1,27 +1,42 @@
-import base64
-import copy
-import hashlib
+import asyncio
+import cachetools
+import functools
+import httpx
+import importlib
+import json
 import logging
+import msgpack
+import orjson
 import os
 import pickle
+import pydantic
+import random
 import redis
 import requests
-from typing import Any, Dict, List
+import threading
+import time
+import weakref
+from typing import Any, Dict, Iterator, List
 import warnings
 
 import openai
 import anthropic
-from anthropic import Anthropic
-import fireworks.client
-from openai import OpenAI
-from retry import retry
-from transformers import AutoModelForCausalLM, AutoModelForVision2Seq, AutoProcessor
+from anthropic import Anthropic, AsyncAnthropic
+from openai import AsyncOpenAI, OpenAI
+from requests.adapters import HTTPAdapter
+import xxhash
+import zstandard
 
+# transformers, torch and fireworks are imported by the code paths of the providers using them, since
+# transformers and torch alone take seconds to import, which processes only calling API models should not pay.
+
+from orby.digitalagent.utils.async_utils import gather_with_semaphore, run_coroutine
 from orby.digitalagent.utils.image_utils import (
     download_image_as_base64_str,
     base64_to_image,
 )
 from orby.digitalagent.model.model_router import lookup_endpoint
+from orby.digitalagent.model.ratelimit import estimate_tokens, get_token_bucket
 
 
 logger = logging.getLogger(__name__)
@@ -29,6 +44,202 @@ ELASTICACHE_HOST = os.environ.get(
     "ELASTICACHE_HOST",
     "fm-calls-valkey-cache-at5ld8.serverless.use2.cache.amazonaws.com",
 )
+# Errors that are worth retrying a generation call on.
+_RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    anthropic.APITimeoutError,
+    openai.InternalServerError,
+    anthropic.InternalServerError,
+    openai.UnprocessableEntityError,
+    anthropic.UnprocessableEntityError,
+    openai.RateLimitError,
+    anthropic.RateLimitError,
+)
+_RETRY_TRIES = 10
+_RETRY_DELAY = 1
+_RETRY_MAX_DELAY = 60
+# Format tags of cached results
+_MSGPACK_TAG = b"m"
+_PICKLE_TAG = b"p"
+_ZSTD_TAG = b"z"
+# zstandard (de)compressors must not be shared across threads
+_zstd_local = threading.local()
+
+
+def _zstd_compressor() -> zstandard.ZstdCompressor:
+    if not hasattr(_zstd_local, "compressor"):
+        _zstd_local.compressor = zstandard.ZstdCompressor(level=3)
+    return _zstd_local.compressor
+
+
+def _zstd_decompressor() -> zstandard.ZstdDecompressor:
+    if not hasattr(_zstd_local, "decompressor"):
+        _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return _zstd_local.decompressor
+
+
+# Keep-alive HTTP session for self-hosted model endpoints, so that calls reuse connections
+# instead of paying a TCP and TLS handshake each.
+_http_session = requests.Session()
+_http_session.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+_http_session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+# HTTP client shared by the OpenAI-compatible clients of all FoundationModel instances. HTTP/2 multiplexes
+# concurrent calls over a single connection where the server supports it (e.g. api.openai.com),
+# plain http:// endpoints such as the internal vLLM servers keep using pooled HTTP/1.1 connections.
+_OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+_openai_http_client = None
+_openai_http_client_lock = threading.Lock()
+
+
+def _get_openai_http_client() -> httpx.Client:
+    global _openai_http_client
+    with _openai_http_client_lock:
+        if _openai_http_client is None:
+            _openai_http_client = openai.DefaultHttpxClient(
+                http2=True, limits=_OPENAI_HTTP_LIMITS
+            )
+        return _openai_http_client
+
+
+_redis_pool = None
+_redis_pool_lock = threading.Lock()
+
+# In-process tier in front of the cache server, for keys answered recently in this process (e.g. repeated
+# prompts in a rollout), which skips the round trip and deserialization. Shared by all FoundationModel instances
+# like the connection pool, since keys already include the provider and host.
+_local_cache = cachetools.LRUCache(maxsize=int(os.environ.get("FM_MEMCACHE", "1024")))
+_local_cache_lock = threading.Lock()
+
+# Prompts rendered with the chat template of huggingface processors, keyed by model name and messages.
+_prompt_cache = cachetools.LRUCache(maxsize=1024)
+_prompt_cache_lock = threading.Lock()
+
+
+def _get_redis_pool() -> redis.BlockingConnectionPool:
+    """
+    Get the connection pool to the cache server shared by all FoundationModel instances in this process,
+    so that instances do not each open their own TLS connections.
+    """
+    global _redis_pool
+    with _redis_pool_lock:
+        if _redis_pool is None:
+            _redis_pool = redis.BlockingConnectionPool(
+                connection_class=redis.SSLConnection,
+                host=ELASTICACHE_HOST,
+                socket_timeout=5,
+                max_connections=int(os.environ.get("REDIS_POOL_SIZE", "32")),
+            )
+        return _redis_pool
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a call that failed with the given error: the delay requested by the provider
+    through the Retry-After headers if any, otherwise a jittered exponential backoff so that concurrent callers
+    do not retry in lockstep.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            if retry_after_ms := response.headers.get("retry-after-ms"):
+                return float(retry_after_ms) / 1000
+            if retry_after := response.headers.get("retry-after"):
+                return float(retry_after)
+        except ValueError:
+            # Retry-After may also be an HTTP date, fall back to the backoff
+            pass
+    return min(_RETRY_MAX_DELAY, _RETRY_DELAY * 2**attempt) + random.random()
+
+
+def _retry_on_transient_errors(func):
+    """Retry a generation call on transient provider errors, see `_retry_delay`."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(_RETRY_TRIES):
+            try:
+                return func(*args, **kwargs)
+            except _RETRYABLE_ERRORS as e:
+                if attempt == _RETRY_TRIES - 1:
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning(f"{e}, retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+
+    return wrapper
+
+
+@functools.lru_cache(maxsize=8)
+def _load_processor(name: str):
+    """Load a huggingface processor once per process, since parsing the tokenizer files takes seconds."""
+    from transformers import AutoProcessor
+
+    return AutoProcessor.from_pretrained(name)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_model(name: str, model_class: type):
+    """
+    Load huggingface model weights once per process, shared by all FoundationModel instances of that model.
+    Weights are kept in the dtype they are stored in (usually bfloat16) instead of being upcast to float32.
+    """
+    model = model_class.from_pretrained(name, torch_dtype="auto")
+    if os.environ.get("FM_TORCH_COMPILE", "") == "1":
+        # Opt-in: fuses the decoder kernels, but recompiles for new input shapes,
+        # so it only pays off for long-running workers.
+        import torch
+
+        model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+
+def _json_key_default(obj: Any) -> str:
+    # Values JSON cannot encode (e.g. tensors of huggingface inputs) are keyed by the digest of their exact pickle
+    # bytes, since a summarizing str() could make different inputs collide.
+    return xxhash.xxh3_128_hexdigest(pickle.dumps(obj))
+
+
+def _pack_key_default(obj: Any) -> bytes:
+    # Values msgpack cannot encode natively (e.g. tensors of huggingface inputs) are keyed by their exact pickle bytes,
+    # since a summarizing str() could make different inputs collide.
+    return pickle.dumps(obj)
+
+
+def _dumps_result(result: Any) -> bytes:
+    """
+    Serialize a raw generation result for the cache, with msgpack for pydantic responses and pickle otherwise,
+    compressed with zstd to cut cache bandwidth and memory.
+    """
+    if isinstance(result, pydantic.BaseModel):
+        cls = type(result)
+        payload = _MSGPACK_TAG + msgpack.packb(
+            {
+                "cls": f"{cls.__module__}:{cls.__qualname__}",
+                "data": result.model_dump(mode="json"),
+            },
+            use_bin_type=True,
+        )
+    else:
+        payload = _PICKLE_TAG + pickle.dumps(result)
+    return _ZSTD_TAG + _zstd_compressor().compress(payload)
+
+
+def _loads_result(payload: bytes) -> Any:
+    """Deserialize a raw generation result serialized by `_dumps_result`."""
+    tag, data = payload[:1], payload[1:]
+    if tag == _ZSTD_TAG:
+        # entries written before compression was introduced are not prefixed with this tag
+        payload = _zstd_decompressor().decompress(data)
+        tag, data = payload[:1], payload[1:]
+    if tag == _MSGPACK_TAG:
+        result = msgpack.unpackb(data, raw=False)
+        module, qualname = result["cls"].split(":")
+        cls = functools.reduce(
+            getattr, qualname.split("."), importlib.import_module(module)
+        )
+        return cls.model_validate(result["data"])
+    return pickle.loads(data)
 
 
 class FoundationModel:
@@ -58,6 +269,15 @@ class FoundationModel:
         # Internal model name used for making the call to model server
         self._model_server_model_name = name
         self.generate_kwargs = kwargs
+        # Async counterparts of self.model for API providers, created lazily per event loop
+        # since the underlying HTTP connection pool cannot be shared across event loops.
+        # Batch calls all run on the shared loop of run_coroutine, so they reuse a single client.
+        self._amodels = weakref.WeakKeyDictionary()
+        self._make_amodel = None
+        # Client used to submit requests through the provider's Batch API, if supported
+        self._batch_client = None
+        # Proactive throttling of API calls, shared by all instances of the same model
+        self._token_bucket = get_token_bucket(provider, name)
 
         assert (
             self.model_name is not None
@@ -65,9 +285,7 @@ class FoundationModel:
         if use_cache == "elasticache":
             if ELASTICACHE_HOST:
                 try:
-                    self.cache = redis.Redis(
-                        host=ELASTICACHE_HOST, ssl=True, socket_timeout=5
-                    )
+                    self.cache = redis.Redis(connection_pool=_get_redis_pool())
                     self.cache.ping()
                 except (
                     redis.exceptions.ConnectionError,
@@ -90,20 +308,38 @@ class FoundationModel:
         if self.model_provider == "openai":
             self.model = OpenAI(
                 api_key=os.environ.get("OPENAI_API_KEY"),
+                http_client=_get_openai_http_client(),
             )
+            self._batch_client = self.model
             self.model = self.model.chat.completions.create
+            self._make_amodel = lambda: AsyncOpenAI(
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                http_client=openai.DefaultAsyncHttpxClient(
+                    http2=True, limits=_OPENAI_HTTP_LIMITS
+                ),
+            ).chat.completions.create
         elif self.model_provider == "anthropic":
             self.model = Anthropic(
                 api_key=os.environ.get("ANTHROPIC_API_KEY"),
             )
+            self._batch_client = self.model
             self.model = self.model.messages.create
+            self._make_amodel = lambda: AsyncAnthropic(
+                api_key=os.environ.get("ANTHROPIC_API_KEY"),
+            ).messages.create
             self.generate_kwargs["timeout"] = self.generate_kwargs.get("timeout", 120)
         elif self.model_provider == "anthropic_beta":
             client = Anthropic(api_key=os.environ.get("ANTHROPIC_BETA_API_KEY"))
+            self._batch_client = client
             self.model = client.beta.messages.create
+            self._make_amodel = lambda: AsyncAnthropic(
+                api_key=os.environ.get("ANTHROPIC_BETA_API_KEY"),
+            ).beta.messages.create
             self.generate_kwargs["timeout"] = self.generate_kwargs.get("timeout", 120)
         elif self.model_provider == "huggingface":
-            self.processor = AutoProcessor.from_pretrained(self.model_name)
+            self.processor = _load_processor(self.model_name)
+
+            from transformers import AutoModelForCausalLM, AutoModelForVision2Seq
 
             AutoModelClass = (
                 AutoModelForVision2Seq
@@ -111,7 +347,7 @@ class FoundationModel:
                 else AutoModelForCausalLM
             )
 
-            self.model = AutoModelClass.from_pretrained(self.model_name)
+            self.model = _load_model(self.model_name, AutoModelClass)
         elif self.model_provider == "mosaic":
             self.model_host_url = kwargs.get(
                 "host_url",
@@ -120,7 +356,7 @@ class FoundationModel:
             if "host_url" in kwargs:
                 del kwargs["host_url"]
 
-            self.processor = AutoProcessor.from_pretrained(self.model_name)
+            self.processor = _load_processor(self.model_name)
         elif self.model_provider == "mosaic-vllm":
             self.model_host_url = kwargs.get(
                 "host_url",
@@ -136,12 +372,23 @@ class FoundationModel:
             self.model = OpenAI(
                 api_key="EMPTY",
                 base_url=self.model_host_url,
+                http_client=_get_openai_http_client(),
             )
             self.model = self.model.chat.completions.create
+            self._make_amodel = lambda: AsyncOpenAI(
+                api_key="EMPTY",
+                base_url=self.model_host_url,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    http2=True, limits=_OPENAI_HTTP_LIMITS
+                ),
+            ).chat.completions.create
         elif self.model_provider == "fireworks":
+            import fireworks.client
+
             fireworks.client.api_key = os.environ.get("FIREWORKS_API_KEY")
 
             self.model = fireworks.client.ChatCompletion.create
+            self._make_amodel = lambda: fireworks.client.ChatCompletion.acreate
         else:
             raise ValueError(f"Invalid model provider: {self.model_provider}.")
 
@@ -158,7 +405,7 @@ class FoundationModel:
 
         USER_PROMPT = "\n\nUser:"
         BOT_PROMPT = "\n\nBot:"
-        prompt = ""
+        parts = []
         is_last_message_user = False
 
         for message in messages:
@@ -166,15 +413,18 @@ class FoundationModel:
                 assert isinstance(
                     message["content"], str
                 ), "User message content must be a string, otherwise a dedicated processor should be available."
-                prompt += USER_PROMPT + message["content"]
+                parts.append(USER_PROMPT)
+                parts.append(message["content"])
                 is_last_message_user = True
             elif message["role"] == "assistant":
-                prompt += BOT_PROMPT + message["content"]
+                parts.append(BOT_PROMPT)
+                parts.append(message["content"])
                 is_last_message_user = False
         if is_last_message_user:
-            prompt += BOT_PROMPT
+            parts.append(BOT_PROMPT)
 
-        return prompt
+        # joining once copies each message a single time, unlike repeated string concatenation
+        return "".join(parts)
 
     def extract_image_list_from_messages(
         self, messages: List[Dict[str, str]]
@@ -195,9 +445,9 @@ class FoundationModel:
                     if content["type"] == "image_url":
                         image_url = content["image_url"]["url"]
 
-                        if image_url.startswith("data:image/png;base64,"):
-                            image_base64 = image_url[len("data:image/png;base64,") :]
-                        else:
+                        # split off the header without scanning the whole base64 payload
+                        header, sep, image_base64 = image_url.partition(",")
+                        if not (sep and header.startswith("data:")):
                             image_base64 = download_image_as_base64_str(image_url)
                         image_list.append(image_base64)
 
@@ -238,9 +488,24 @@ class FoundationModel:
                         {"role": message["role"], "content": new_content}
                     )
 
-            prompt = self.processor.apply_chat_template(
-                new_messages, add_generation_prompt=True
+            # Images were replaced by placeholders above, so the key stays small. transformers already caches
+            # the compiled Jinja template, but rendering long histories still costs milliseconds per call.
+            key = (
+                self.model_name,
+                xxhash.xxh3_128_digest(
+                    msgpack.packb(
+                        new_messages, default=_pack_key_default, use_bin_type=True
+                    )
+                ),
             )
+            with _prompt_cache_lock:
+                prompt = _prompt_cache.get(key)
+            if prompt is None:
+                prompt = self.processor.apply_chat_template(
+                    new_messages, add_generation_prompt=True
+                )
+                with _prompt_cache_lock:
+                    _prompt_cache[key] = prompt
             return prompt
         except ValueError:
             return self._messages_to_prompt(messages)
@@ -269,11 +534,10 @@ class FoundationModel:
                     if content["type"] == "image_url":
                         image_url = content["image_url"]["url"]
 
-                        if image_url.startswith("data:"):
-                            image_base64 = image_url.split(",")[1]
-                            media_type = (
-                                image_url.split(",")[0].split(":")[1].split(";")[0]
-                            )
+                        # split off the header without scanning the whole base64 payload
+                        header, sep, image_base64 = image_url.partition(",")
+                        if sep and header.startswith("data:"):
+                            media_type = header[len("data:") :].split(";", 1)[0]
                         else:
                             image_base64 = download_image_as_base64_str(image_url)
                             image = base64_to_image(image_base64)
@@ -287,6 +551,8 @@ class FoundationModel:
                                 "data": image_base64,
                             },
                         }
+                        if "cache_control" in content:
+                            new_content["cache_control"] = content["cache_control"]
                         new_content_list.append(new_content)
                     else:
                         new_content_list.append(content)
@@ -298,79 +564,182 @@ class FoundationModel:
 
         return new_messages
 
+    def _cache_key(self, kwargs: dict) -> bytes:
+        """
+        Compute the cache key of a raw generation call.
+
+        Args:
+            kwargs (dict): The keyword arguments of the raw generation call.
+
+        Returns:
+            bytes: The cache key.
+        """
+        key = {
+            "kw": kwargs,
+            "provider": self.model_provider,
+            "host": getattr(self, "model_host_url", None),
+        }
+        # keys are sorted at every nesting level (messages, tool schemas...) to reduce accidental misses
+        key = orjson.dumps(
+            key,
+            default=_json_key_default,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        )
+        return xxhash.xxh3_128_digest(key)
+
+    def _cache_get(self, key: bytes) -> Any | None:
+        """Look up a raw generation result in the in-process cache, then in the cache server."""
+        with _local_cache_lock:
+            result = _local_cache.get(key)
+        if result is None and (cached := self.cache.get(key)):
+            result = _loads_result(cached)
+            with _local_cache_lock:
+                _local_cache[key] = result
+        return result
+
+    def _cache_set(self, key: bytes, result: Any) -> None:
+        with _local_cache_lock:
+            _local_cache[key] = result
+        self.cache.set(key, _dumps_result(result))
+
     def cached_raw_generate(self, func):
         def wrapper(**kwargs):
             if self.cache is None:
                 return func(**kwargs)
 
-            key = copy.deepcopy(kwargs)
-            key["model_provider"] = self.model_provider
-            if hasattr(self, "model_host_url"):
-                key["model_host_url"] = self.model_host_url
-            # sort by keys to reduce accidental misses
-            key = dict(sorted(key.items()))
-            key = pickle.dumps(key)
-            m = hashlib.sha512()
-            m.update(key)
-            key = m.digest()
-            if cached := self.cache.get(key):
-                return pickle.loads(cached)
+            key = self._cache_key(kwargs)
+            if (result := self._cache_get(key)) is not None:
+                return result
             result = func(**kwargs)
-            self.cache.set(key, pickle.dumps(result))
+            self._cache_set(key, result)
             return result
 
         return wrapper
 
-    # TODO: return structured response for better handling of tracing
-    @retry(
-        (
-            openai.APITimeoutError,
-            anthropic.APITimeoutError,
-            openai.InternalServerError,
-            anthropic.InternalServerError,
-            openai.UnprocessableEntityError,
-            anthropic.UnprocessableEntityError,
-            openai.RateLimitError,
-            anthropic.RateLimitError,
-        ),
-        tries=10,
-        delay=1,
-        backoff=1,
-    )
-    def generate(
-        self,
-        *,
-        messages: List[Dict[str, str]],
-        max_tokens: int = 512,
-        return_raw: bool = False,
-        additional_inputs: dict = {},
-        **kwargs,
-    ) -> tuple[str, Any]:
+    def cached_raw_agenerate(self, func):
+        async def wrapper(**kwargs):
+            if self.cache is None:
+                return await func(**kwargs)
+
+            key = self._cache_key(kwargs)
+            with _local_cache_lock:
+                result = _local_cache.get(key)
+            # cache server calls block, so they run in worker threads to keep the event loop free
+            # for the other in-flight generation calls
+            if result is None:
+                result = await asyncio.to_thread(self._cache_get, key)
+            if result is not None:
+                return result
+            result = await func(**kwargs)
+            await asyncio.to_thread(self._cache_set, key, result)
+            return result
+
+        return wrapper
+
+    def cached_raw_generate_batch(self, func, list_of_kwargs: List[dict]) -> list:
         """
-        Generate text based on the given prompt.
+        Cached version of a batched raw generation call, looking up and storing all entries
+        missing from the in-process cache in one round trip to the cache server each.
 
         Args:
-            messages (List[Dict[str, str]]): The prompt for text generation, in the multimodal messages format.
-                See https://platform.openai.com/docs/api-reference/making-requests for an example.
+            func: Function generating the raw results of a list of keyword arguments, in order.
+                Only called with the keyword arguments that missed the cache.
+            list_of_kwargs (List[dict]): The keyword arguments of each raw generation call.
 
-            max_tokens (int, optional): The maximum number of tokens to generate. Defaults to 512.
+        Returns:
+            list: The raw results, in the same order as `list_of_kwargs`.
+        """
+        if self.cache is None:
+            return func(list_of_kwargs)
 
-            additional_inputs (dict, optional): Additional inputs specific to processor of a Hugging Face model.
-                Defaults to an empty dictionary.
+        keys = [self._cache_key(kwargs) for kwargs in list_of_kwargs]
+        with _local_cache_lock:
+            results = [_local_cache.get(key) for key in keys]
 
-            **kwargs: Additional arguments specific to the language model provider.
+        remote = [i for i, result in enumerate(results) if result is None]
+        if remote:
+            pipe = self.cache.pipeline(transaction=False)
+            for i in remote:
+                pipe.get(keys[i])
+            for i, cached in zip(remote, pipe.execute()):
+                if cached:
+                    results[i] = _loads_result(cached)
 
-        Returns:
-            str: The generated text.
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            generated = func([list_of_kwargs[i] for i in misses])
+            pipe = self.cache.pipeline(transaction=False)
+            for i, result in zip(misses, generated):
+                results[i] = result
+                pipe.set(keys[i], _dumps_result(result))
+            pipe.execute()
+
+        with _local_cache_lock:
+            for key, result in zip(keys, results):
+                _local_cache[key] = result
+        return results
+
+    def _rate_limited(self, func):
+        if self._token_bucket is None:
+            return func
+
+        def wrapper(**kwargs):
+            self._token_bucket.acquire(
+                estimate_tokens(kwargs["messages"], kwargs["max_tokens"])
+            )
+            return func(**kwargs)
+
+        return wrapper
+
+    def _arate_limited(self, func):
+        if self._token_bucket is None:
+            return func
+
+        async def wrapper(**kwargs):
+            await self._token_bucket.aacquire(
+                estimate_tokens(kwargs["messages"], kwargs["max_tokens"])
+            )
+            return await func(**kwargs)
+
+        return wrapper
+
+    def _merge_generate_kwargs(self, max_tokens: int, kwargs: dict) -> tuple[int, dict]:
         """
+        Merge the per-call generation arguments into the ones given at initialization.
 
-        generate_kwargs = copy.deepcopy(self.generate_kwargs)
-        generate_kwargs.update(kwargs)
+        Args:
+            max_tokens (int): The maximum number of tokens to generate, unless overridden by `max_tokens` in the kwargs.
+            kwargs (dict): The per-call generation arguments.
+
+        Returns:
+            tuple[int, dict]: The maximum number of tokens to generate and the merged generation arguments.
+        """
+        # only top-level keys are added or removed downstream, so a shallow copy keeps self.generate_kwargs intact
+        generate_kwargs = {**self.generate_kwargs, **kwargs}
 
         if "max_tokens" in generate_kwargs:
             max_tokens = generate_kwargs["max_tokens"]
             del generate_kwargs["max_tokens"]
 
+        return max_tokens, generate_kwargs
+
+    def _build_call_kwargs(
+        self, messages: List[Dict[str, str]], max_tokens: int, **kwargs
+    ) -> dict:
+        """
+        Build the keyword arguments of a chat completion call to an API provider
+        (openai, mosaic-vllm, fireworks, anthropic, anthropic_beta), shared by `generate` and `agenerate`.
+
+        Args:
+            messages (List[Dict[str, str]]): The prompt for text generation, in the multimodal messages format.
+            max_tokens (int): The maximum number of tokens to generate.
+            **kwargs: Additional arguments specific to the language model provider.
+
+        Returns:
+            dict: The keyword arguments to call `self.model` or its async counterpart with.
+        """
+        max_tokens, generate_kwargs = self._merge_generate_kwargs(max_tokens, kwargs)
+
         if messages[0]["role"] == "system":
             if self.model_provider in ["fireworks"]:
                 # Fireworks and Mosaic VLLM don't support system prompts, so we need to combine it with the first user prompt
@@ -393,23 +762,92 @@ class FoundationModel:
                     messages = [{"role": "user", "content": system_content}] + messages[
                         1:
                     ]
-            elif self.model_provider == "anthropic":
-                # Anthropic doesn't support "system" as a role, but as a separate "system" argument
-                system_prompt = (
-                    messages[0]["content"]
+            elif self.model_provider in ["anthropic", "anthropic_beta"]:
+                # Anthropic doesn't support "system" as a role, but as a separate "system" argument.
+                # System text blocks keep their own cache breakpoints, e.g. one after a static block of
+                # action documentation followed by per-task text; otherwise the whole prompt is cached.
+                system_content = (
+                    [{"type": "text", "text": messages[0]["content"]}]
                     if isinstance(messages[0]["content"], str)
-                    else messages[0]["content"][0]["text"]
+                    else [dict(content) for content in messages[0]["content"]]
                 )
-                generate_kwargs["system"] = [
-                    {
-                        "type": "text",
-                        "text": system_prompt,
-                        "cache_control": {"type": "ephemeral"},
-                    }
-                ]
+                if not any("cache_control" in content for content in system_content):
+                    system_content[-1]["cache_control"] = {"type": "ephemeral"}
+                generate_kwargs["system"] = system_content
                 messages = messages[1:]
 
+        if self.model_provider in ["anthropic", "anthropic_beta"]:
+            if "frequency_penalty" in generate_kwargs:
+                del generate_kwargs["frequency_penalty"]
+            messages = self._convert_image_format_for_anthropic(messages)
+        if self.model_provider == "anthropic_beta":
+            # Enabling thinking with Claude Computer Use tool doesn't support setting temperature value to anything other than 1
+            generate_kwargs.pop("temperature")
+
+        return {
+            "model": self._model_server_model_name,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            **generate_kwargs,
+        }
+
+    def _parse_response(self, raw: Any, return_raw: bool) -> Any:
+        """
+        Extract the generated text from the raw response of an API provider.
+
+        Args:
+            raw (Any): The raw response returned by `self.model` or its async counterpart.
+            return_raw (bool): Whether to also return the raw response.
+
+        Returns:
+            Any: The generated text, or the generated text and the raw response if `return_raw` is set.
+        """
+        if self.model_provider in ["anthropic", "anthropic_beta"]:
+            # Uncomment for debugging
+            # print(f"{'\033[32m'}LLM says: {raw.content[0].text} {'\033[0m'}")
+            if return_raw:
+                if self.model_provider == "anthropic_beta":
+                    return raw
+                return raw.content[0].text, raw
+            return raw.content[0].text
+
+        if return_raw:
+            return raw.choices[0].message.content, raw
+        return raw.choices[0].message.content
+
+    # TODO: return structured response for better handling of tracing
+    @_retry_on_transient_errors
+    def generate(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 512,
+        return_raw: bool = False,
+        additional_inputs: dict = {},
+        **kwargs,
+    ) -> tuple[str, Any]:
+        """
+        Generate text based on the given prompt.
+
+        Args:
+            messages (List[Dict[str, str]]): The prompt for text generation, in the multimodal messages format.
+                See https://platform.openai.com/docs/api-reference/making-requests for an example.
+
+            max_tokens (int, optional): The maximum number of tokens to generate. Defaults to 512.
+
+            additional_inputs (dict, optional): Additional inputs specific to processor of a Hugging Face model.
+                Defaults to an empty dictionary.
+
+            **kwargs: Additional arguments specific to the language model provider.
+
+        Returns:
+            str: The generated text.
+        """
+
         if self.model_provider == "huggingface":
+            max_tokens, generate_kwargs = self._merge_generate_kwargs(
+                max_tokens, kwargs
+            )
             prompt = self.messages_to_prompt(messages)
             images = self.extract_image_list_from_messages(messages)
             args = {
@@ -419,76 +857,40 @@ class FoundationModel:
             if len(images) > 0:
                 args["images"] = [base64_to_image(img) for img in images]
             inputs = self.processor(**args, **additional_inputs)
-            output = self.cached_raw_generate(self.model.generate)(
-                **inputs, max_new_tokens=max_tokens, **generate_kwargs
-            )
+            import torch
+
+            # skip autograd bookkeeping during decoding
+            with torch.inference_mode():
+                output = self.cached_raw_generate(self.model.generate)(
+                    **inputs, max_new_tokens=max_tokens, **generate_kwargs
+                )
             output_text = self.processor.decode(output[0], skip_special_tokens=True)
 
             if return_raw:
                 return output_text, output
             else:
                 return output_text
-        elif (
-            self.model_provider == "openai"
-            or self.model_provider == "mosaic-vllm"
-            or self.model_provider == "fireworks"
-        ):
-            raw = self.cached_raw_generate(self.model)(
-                model=self._model_server_model_name,
-                messages=messages,
-                max_tokens=max_tokens,
-                **generate_kwargs,
+        elif self.model_provider in [
+            "openai",
+            "mosaic-vllm",
+            "fireworks",
+            "anthropic",
+            "anthropic_beta",
+        ]:
+            raw = self.cached_raw_generate(self._rate_limited(self.model))(
+                **self._build_call_kwargs(messages, max_tokens, **kwargs)
             )
-            if return_raw:
-                return raw.choices[0].message.content, raw
-            else:
-                return raw.choices[0].message.content
-        elif self.model_provider == "anthropic":
-            if "frequency_penalty" in generate_kwargs:
-                del generate_kwargs["frequency_penalty"]
-            messages = self._convert_image_format_for_anthropic(messages)
-            
-            raw = self.cached_raw_generate(self.model)(
-                model=self._model_server_model_name,
-                messages=messages,
-                max_tokens=max_tokens,
-                **generate_kwargs,
-            )
-            # Uncomment for debugging
-            # print(f"{'\033[32m'}LLM says: {raw.content[0].text} {'\033[0m'}")
-
-            if return_raw:
-                return raw.content[0].text, raw
-            else:
-                return raw.content[0].text
-        elif self.model_provider == "anthropic_beta":
-            if "frequency_penalty" in generate_kwargs:
-                del generate_kwargs["frequency_penalty"]
-            messages = self._convert_image_format_for_anthropic(messages)
-            
-            # Enabling thinking with Claude Computer Use tool doesn't support setting temperature value to anything other than 1
-            generate_kwargs.pop("temperature")
-            raw = self.cached_raw_generate(self.model)(
-                model=self._model_server_model_name,
-                messages=messages,
-                max_tokens=max_tokens,
-                **generate_kwargs,
-            )
-            # Uncomment for debugging
-            # print(f"{'\033[32m'}LLM says: {raw.content[0].text} {'\033[0m'}")
-
-            if return_raw:
-                return raw
-            else:
-                return raw.content[0].text
-
+            return self._parse_response(raw, return_raw)
         elif self.model_provider == "mosaic":
+            max_tokens, generate_kwargs = self._merge_generate_kwargs(
+                max_tokens, kwargs
+            )
             # adopted from multimodal/scripts/inference/client.py
             prompt = self.messages_to_prompt(messages)
             images = self.extract_image_list_from_messages(messages)
 
-            output = self.cached_raw_generate(requests.post)(
-                self.model_host_url,
+            output = self.cached_raw_generate(_http_session.post)(
+                url=self.model_host_url,
                 json={
                     "prompt": prompt,
                     "images": images,
@@ -506,3 +908,366 @@ class FoundationModel:
                 return generated_text
         else:
             raise ValueError(f"Invalid model provider: {self.model_provider}.")
+
+    def generate_stream(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 512,
+        **kwargs,
+    ) -> Iterator[str]:
+        """
+        Generate text based on the given prompt, yielding it in chunks as the provider streams it back,
+        so that callers can start processing the output before generation finishes.
+        Providers without streaming support (huggingface, mosaic) yield the whole text at once.
+
+        Responses served from the cache are yielded in one chunk. Streamed responses are not added to the cache,
+        since the provider never returns the complete raw response that the cache stores.
+
+        Args:
+            Same as `generate`, except `return_raw` and `additional_inputs`.
+
+        Returns:
+            Iterator[str]: The chunks of generated text.
+        """
+        if self.model_provider not in [
+            "openai",
+            "mosaic-vllm",
+            "fireworks",
+            "anthropic",
+            "anthropic_beta",
+        ]:
+            yield self.generate(messages=messages, max_tokens=max_tokens, **kwargs)
+            return
+
+        call_kwargs = self._build_call_kwargs(messages, max_tokens, **kwargs)
+        if self.cache is not None:
+            if (raw := self._cache_get(self._cache_key(call_kwargs))) is not None:
+                yield self._parse_response(raw, return_raw=False)
+                return
+
+        stream = _retry_on_transient_errors(self._rate_limited(self.model))(
+            stream=True, **call_kwargs
+        )
+        if self.model_provider in ["anthropic", "anthropic_beta"]:
+            for event in stream:
+                if (
+                    event.type == "content_block_delta"
+                    and event.delta.type == "text_delta"
+                ):
+                    yield event.delta.text
+        else:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def agenerate(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 512,
+        return_raw: bool = False,
+        additional_inputs: dict = {},
+        **kwargs,
+    ) -> tuple[str, Any]:
+        """
+        Asynchronous version of `generate`. API providers are called through their async clients,
+        other providers fall back to running `generate` in a worker thread.
+
+        Args:
+            Same as `generate`.
+
+        Returns:
+            str: The generated text.
+        """
+        if self._make_amodel is None:
+            return await asyncio.to_thread(
+                self.generate,
+                messages=messages,
+                max_tokens=max_tokens,
+                return_raw=return_raw,
+                additional_inputs=additional_inputs,
+                **kwargs,
+            )
+
+        raw = await self._araw_generate(
+            self._build_call_kwargs(messages, max_tokens, **kwargs)
+        )
+        return self._parse_response(raw, return_raw)
+
+    async def _araw_generate(self, call_kwargs: dict, use_cache: bool = True) -> Any:
+        """
+        Call the async client of an API provider, retrying on transient errors.
+
+        Args:
+            call_kwargs (dict): The keyword arguments built by `_build_call_kwargs`.
+            use_cache (bool, optional): Whether to go through the cache. Defaults to True.
+
+        Returns:
+            Any: The raw response.
+        """
+        loop = asyncio.get_running_loop()
+        amodel = self._amodels.get(loop)
+        if amodel is None:
+            amodel = self._amodels[loop] = self._make_amodel()
+
+        func = self._arate_limited(amodel)
+        if use_cache:
+            func = self.cached_raw_agenerate(func)
+        for attempt in range(_RETRY_TRIES):
+            try:
+                return await func(**call_kwargs)
+            except _RETRYABLE_ERRORS as e:
+                if attempt == _RETRY_TRIES - 1:
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning(f"{e}, retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+
+    def generate_batch(
+        self,
+        list_of_messages: List[List[Dict[str, str]]],
+        max_concurrency: int = 16,
+        max_tokens: int = 512,
+        return_raw: bool = False,
+        **kwargs,
+    ) -> list:
+        """
+        Generate text for many prompts concurrently. Generation calls are network-bound,
+        so overlapping them makes a batch take about as long as its slowest call.
+        For API providers, cache lookups and stores of the whole batch are pipelined.
+
+        Args:
+            list_of_messages (List[List[Dict[str, str]]]): The prompts for text generation, each in the multimodal messages format.
+            max_concurrency (int, optional): The maximum number of in-flight generation calls. Defaults to 16.
+            max_tokens (int, optional): The maximum number of tokens to generate. Defaults to 512.
+            return_raw (bool, optional): Whether to also return the raw responses. Defaults to False.
+            **kwargs: Additional arguments passed to `generate` for every prompt.
+
+        Returns:
+            list: The outputs of `generate`, in the same order as `list_of_messages`.
+        """
+
+        if self._make_amodel is None:
+            return run_coroutine(
+                gather_with_semaphore(
+                    lambda messages: self.agenerate(
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        return_raw=return_raw,
+                        **kwargs,
+                    ),
+                    list_of_messages,
+                    max_concurrency,
+                )
+            )
+
+        raws = self._raw_generate_batch(
+            [
+                self._build_call_kwargs(messages, max_tokens, **kwargs)
+                for messages in list_of_messages
+            ],
+            max_concurrency,
+        )
+        return [self._parse_response(raw, return_raw) for raw in raws]
+
+    def generate_many(
+        self,
+        list_of_messages: List[List[Dict[str, str]]],
+        max_concurrency: int = 16,
+        max_tokens: int = 512,
+        return_raw: bool = False,
+        **kwargs,
+    ) -> list:
+        """
+        Same as `generate_batch`, but prompts repeated in the batch (e.g. sampling several candidates for
+        the same step) are sent as a single request asking for multiple choices through `n`,
+        for the providers that support it (openai, mosaic-vllm, fireworks).
+
+        Args:
+            Same as `generate_batch`.
+
+        Returns:
+            list: The outputs of `generate`, in the same order as `list_of_messages`.
+        """
+        if self.model_provider not in ["openai", "mosaic-vllm", "fireworks"]:
+            return self.generate_batch(
+                list_of_messages, max_concurrency, max_tokens, return_raw, **kwargs
+            )
+
+        groups = {}
+        for i, messages in enumerate(list_of_messages):
+            groups.setdefault(msgpack.packb(messages, use_bin_type=True), []).append(i)
+        groups = list(groups.values())
+
+        list_of_call_kwargs = []
+        for indices in groups:
+            call_kwargs = self._build_call_kwargs(
+                list_of_messages[indices[0]], max_tokens, **kwargs
+            )
+            if len(indices) > 1:
+                call_kwargs["n"] = len(indices)
+            list_of_call_kwargs.append(call_kwargs)
+        raws = self._raw_generate_batch(list_of_call_kwargs, max_concurrency)
+
+        outputs = [None] * len(list_of_messages)
+        for indices, raw in zip(groups, raws):
+            choices = sorted(raw.choices, key=lambda choice: choice.index)
+            for i, choice in zip(indices, choices):
+                text = choice.message.content
+                outputs[i] = (text, raw) if return_raw else text
+        return outputs
+
+    def _raw_generate_batch(
+        self, list_of_call_kwargs: List[dict], max_concurrency: int
+    ) -> list:
+        """
+        Call the async client of an API provider for each of the given keyword arguments concurrently,
+        with cache lookups and stores of the whole batch pipelined.
+
+        Args:
+            list_of_call_kwargs (List[dict]): The keyword arguments built by `_build_call_kwargs`.
+            max_concurrency (int): The maximum number of in-flight calls.
+
+        Returns:
+            list: The raw responses, in the same order as `list_of_call_kwargs`.
+        """
+        return self.cached_raw_generate_batch(
+            lambda misses: run_coroutine(
+                gather_with_semaphore(
+                    lambda call_kwargs: self._araw_generate(
+                        call_kwargs, use_cache=False
+                    ),
+                    misses,
+                    max_concurrency,
+                )
+            ),
+            list_of_call_kwargs,
+        )
+
+    def submit_batch(
+        self,
+        list_of_messages: List[List[Dict[str, str]]],
+        custom_ids: List[str] | None = None,
+        max_tokens: int = 512,
+        **kwargs,
+    ) -> str:
+        """
+        Submit prompts to the provider's Batch API, which is billed at a discount and does not count
+        against the synchronous rate limits, at the cost of results arriving within hours instead of seconds.
+        Supported for the openai, anthropic and anthropic_beta providers.
+
+        Args:
+            list_of_messages (List[List[Dict[str, str]]]): The prompts for text generation, each in the multimodal messages format.
+            custom_ids (List[str], optional): Ids used to match results to prompts. Defaults to the prompt indices.
+            max_tokens (int, optional): The maximum number of tokens to generate. Defaults to 512.
+            **kwargs: Additional arguments specific to the language model provider.
+
+        Returns:
+            str: The id of the batch, to be passed to `poll_batch` and `fetch_batch_results`.
+        """
+        if self._batch_client is None:
+            raise ValueError(
+                f"Batch API is not supported for model provider: {self.model_provider}."
+            )
+        if custom_ids is None:
+            custom_ids = [str(i) for i in range(len(list_of_messages))]
+        assert len(custom_ids) == len(
+            list_of_messages
+        ), "`custom_ids` must have the same length as `list_of_messages`."
+
+        requests_params = []
+        for messages in list_of_messages:
+            params = self._build_call_kwargs(messages, max_tokens, **kwargs)
+            # timeout is an option of the client, not part of the request
+            params.pop("timeout", None)
+            requests_params.append(params)
+
+        if self.model_provider == "openai":
+            lines = [
+                json.dumps(
+                    {
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": params,
+                    }
+                )
+                for custom_id, params in zip(custom_ids, requests_params)
+            ]
+            batch_file = self._batch_client.files.create(
+                file=("batch.jsonl", "\n".join(lines).encode()), purpose="batch"
+            )
+            batch = self._batch_client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+            )
+        else:
+            batch = self._batch_client.beta.messages.batches.create(
+                requests=[
+                    {"custom_id": custom_id, "params": params}
+                    for custom_id, params in zip(custom_ids, requests_params)
+                ]
+            )
+        return batch.id
+
+    def poll_batch(self, batch_id: str) -> str:
+        """
+        Get the status of a batch submitted with `submit_batch`.
+
+        Args:
+            batch_id (str): The id returned by `submit_batch`.
+
+        Returns:
+            str: The status reported by the provider, e.g. "in_progress", "completed" (OpenAI) or "ended" (Anthropic).
+        """
+        if self.model_provider == "openai":
+            return self._batch_client.batches.retrieve(batch_id).status
+        return self._batch_client.beta.messages.batches.retrieve(
+            batch_id
+        ).processing_status
+
+    def fetch_batch_results(
+        self, batch_id: str, return_raw: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Fetch the results of a finished batch submitted with `submit_batch`.
+
+        Args:
+            batch_id (str): The id returned by `submit_batch`.
+            return_raw (bool, optional): Whether to also return the raw responses. Defaults to False.
+
+        Returns:
+            Dict[str, Any]: The generated text (and raw response if `return_raw` is set) keyed by custom id.
+                Requests that failed are mapped to None.
+        """
+        results = {}
+        if self.model_provider == "openai":
+            batch = self._batch_client.batches.retrieve(batch_id)
+            if batch.output_file_id is None:
+                raise ValueError(
+                    f"Batch {batch_id} has no results yet: {batch.status}."
+                )
+            content = self._batch_client.files.content(batch.output_file_id)
+            for line in content.text.splitlines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                response = result.get("response")
+                if response is None or response["status_code"] != 200:
+                    results[result["custom_id"]] = None
+                    continue
+                text = response["body"]["choices"][0]["message"]["content"]
+                results[result["custom_id"]] = (
+                    (text, response["body"]) if return_raw else text
+                )
+        else:
+            for result in self._batch_client.beta.messages.batches.results(batch_id):
+                if result.result.type != "succeeded":
+                    results[result.custom_id] = None
+                    continue
+                results[result.custom_id] = self._parse_response(
+                    result.result.message, return_raw
+                )
+        return results
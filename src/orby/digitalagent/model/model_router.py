@@ -22,14 +22,49 @@ def get_router_file_folder() -> str:
     return folder
 
 
+# Router files fetched by any process are kept on local disk for this long, so that new processes
+# do not each pay an S3 round trip. Endpoints report every 10 minutes, so this matches their freshness.
+_LOCAL_ROUTER_CACHE_DIR = os.path.expanduser("~/.cache/orby/router")
+_LOCAL_ROUTER_CACHE_TTL_SECS = 10 * 60
+
+
+def _read_local_router_cache(path: str) -> dict | None:
+    try:
+        if time.time() - os.path.getmtime(path) > _LOCAL_ROUTER_CACHE_TTL_SECS:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_local_router_cache(path: str, config: dict) -> None:
+    try:
+        os.makedirs(_LOCAL_ROUTER_CACHE_DIR, exist_ok=True)
+        # write then rename, so that concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(config, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to cache router file locally:{str(e)}")
+
+
 @functools.cache
 def load_router_file(model_name: str) -> dict | None:
     if os.environ.get("MOSAIC_VLLM_MODEL_HOST_URL", "").startswith("http"):
         return None
     folder = get_router_file_folder()
     path = os.path.join(folder, hashlib.sha256(model_name.encode()).hexdigest())
+    local_path = os.path.join(
+        _LOCAL_ROUTER_CACHE_DIR, hashlib.sha256(path.encode()).hexdigest()
+    )
+    if (config := _read_local_router_cache(local_path)) is not None:
+        return config
     with file_utils.open(path) as f:
-        return json.load(f)
+        config = json.load(f)
+    _write_local_router_cache(local_path, config)
+    return config
 
 
 def lookup_endpoint(host: str, model_name: str) -> tuple[str, str]:
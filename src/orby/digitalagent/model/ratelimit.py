@@ -0,0 +1,130 @@
+"""
+Client-side rate limiting of foundation model API calls.
+
+Throttling before dispatch keeps a process under the provider's requests/tokens per minute limits,
+instead of relying on retries after the provider rejects a call with a rate limit error.
+Limits are read from environment variables named after the provider, e.g. OPENAI_RPM and OPENAI_TPM
+for "openai" or MOSAIC_VLLM_RPM for "mosaic-vllm". Providers without limits set are not throttled.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+# Rough token cost of an image content item, e.g. OpenAI charges ~1100 tokens for a 1280x720 screenshot.
+_IMAGE_TOKENS = 1000
+
+
+class TokenBucket:
+    """
+    Token bucket limiting both the number of requests and the number of tokens per minute.
+    Thread-safe, and usable from coroutines through `aacquire`.
+    """
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None) -> None:
+        """
+        Initialize the TokenBucket. Both buckets start full.
+
+        Args:
+            rpm (float, optional): Maximum requests per minute. Defaults to None, i.e. unlimited.
+            tpm (float, optional): Maximum tokens per minute. Defaults to None, i.e. unlimited.
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm or 0.0
+        self._tokens = tpm or 0.0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """
+        Take capacity for one request of the given number of tokens if available.
+
+        Returns:
+            float: 0 if the capacity was taken, otherwise the number of seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_refill
+            self._last_refill = now
+            if self.rpm:
+                self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+            if self.tpm:
+                self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+                # a request larger than the whole bucket would otherwise never go through
+                tokens = min(tokens, self.tpm)
+
+            wait = 0.0
+            if self.rpm and self._requests < 1:
+                wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+            if self.tpm and self._tokens < tokens:
+                wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+            if wait == 0:
+                self._requests -= 1
+                self._tokens -= tokens
+            return wait
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until one request of the given number of tokens fits in the buckets."""
+        while (wait := self._reserve(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        """Asynchronous version of `acquire`, which does not block the event loop."""
+        while (wait := self._reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+
+_buckets: dict[tuple[str, str], TokenBucket | None] = {}
+_buckets_lock = threading.Lock()
+
+
+def _env_limit(provider: str, suffix: str) -> float | None:
+    value = os.environ.get(f"{provider.upper().replace('-', '_')}_{suffix}")
+    return float(value) if value else None
+
+
+def get_token_bucket(provider: str, model_name: str) -> TokenBucket | None:
+    """
+    Get the token bucket shared by all calls to a model in this process.
+
+    Args:
+        provider (str): The provider of the model.
+        model_name (str): The name of the model.
+
+    Returns:
+        TokenBucket | None: The token bucket, or None if no limits are configured for the provider.
+    """
+    key = (provider, model_name)
+    with _buckets_lock:
+        if key not in _buckets:
+            rpm = _env_limit(provider, "RPM")
+            tpm = _env_limit(provider, "TPM")
+            _buckets[key] = TokenBucket(rpm, tpm) if rpm or tpm else None
+        return _buckets[key]
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int = 0) -> int:
+    """
+    Cheaply estimate the number of tokens a generation call will consume, at ~4 characters per token.
+
+    Args:
+        messages (list[dict]): The prompt, in the multimodal messages format.
+        max_tokens (int, optional): The maximum number of tokens to generate. Defaults to 0.
+
+    Returns:
+        int: The estimated number of prompt and completion tokens.
+    """
+    chars = 0
+    images = 0
+    for message in messages:
+        if isinstance(message["content"], str):
+            chars += len(message["content"])
+            continue
+        for content in message["content"]:
+            if content["type"] == "text":
+                chars += len(content["text"])
+            elif content["type"] in ("image_url", "image"):
+                images += 1
+    return chars // 4 + images * _IMAGE_TOKENS + max_tokens
@@ -1,51 +1,199 @@
+from contextlib import closing
 from PIL import Image
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+import asyncio
+import cachetools
+import hashlib
 import logging
-import numpy as np
+import orjson
+import os
 import re
+import sqlite3
+import string
+import threading
 
 from orby.digitalagent.agent import utils, Agent
 from orby.digitalagent.model import FoundationModel
 from orby.digitalagent.planner import constants
+from orby.digitalagent.utils.async_utils import gather_with_semaphore, run_coroutine
+from orby.digitalagent.utils.image_utils import base64_to_image
+
+# Regular expression to match substrings enclosed in triple backticks
+_FENCE_RE = re.compile(r"```([^`]+)```")
+# Atomic classification of the decompose response, e.g. "<atomic>No</atomic>"
+_ATOMIC_RE = re.compile(r"<atomic>\s*(Yes|No)\s*</atomic>", re.IGNORECASE)
+# Answer lines of the batch evaluator, e.g. "[2] No: B clicks a different button"
+_BATCH_ANSWER_RE = re.compile(r"^\[(\d+)\]\s*(Yes|No)", re.MULTILINE | re.IGNORECASE)
+
+
+def _split_template(template: str, **fixed) -> tuple:
+    """
+    Split a str.format template once into its literal text and field names, so that rendering it
+    only joins strings instead of parsing the template again. Fields given in `fixed` are filled in right away.
+
+    Returns:
+    (literals, fields), where literals has one more item than fields.
+    """
+    literals = [""]
+    fields = []
+    for literal, field, _, _ in string.Formatter().parse(template):
+        literals[-1] += literal
+        if field is None:
+            continue
+        if field in fixed:
+            literals[-1] += str(fixed[field])
+        else:
+            fields.append(field)
+            literals.append("")
+    return tuple(literals), tuple(fields)
+
+
+# Providers downscale larger screenshots to about this long edge anyway (Anthropic to 1568 pixels,
+# OpenAI to a 768 pixel short edge), so sending more pixels only costs upload bytes.
+_MAX_SCREENSHOT_SIZE = 1568
+_SCREENSHOT_JPEG_QUALITY = 85
+
+_DEFAULT_RESPONSE_CACHE_PATH = os.path.expanduser(
+    "~/.cache/orby/planner/responses.sqlite"
+)
+
+
+class _ResponseCache:
+    """
+    Exact-match cache of model responses, kept in memory and optionally in a SQLite file,
+    so that reruns on the same prompts do not call the model again.
+    """
+
+    def __init__(self, path: Optional[str], maxsize: int = 4096):
+        self.path = path
+        self._memory = cachetools.LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with closing(sqlite3.connect(path)) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)"
+                )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            response = self._memory.get(key)
+        if response is None and self.path:
+            with closing(sqlite3.connect(self.path)) as conn:
+                row = conn.execute(
+                    "SELECT response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if row:
+                response = row[0]
+                with self._lock:
+                    self._memory[key] = response
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        with self._lock:
+            self._memory[key] = response
+        if self.path:
+            with closing(sqlite3.connect(self.path)) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?)", (key, response)
+                )
+
+
+def _render_template(parts: tuple, **kwargs) -> str:
+    """Render a template split by _split_template, like str.format would."""
+    literals, fields = parts
+    pieces = [literals[0]]
+    for field, literal in zip(fields, literals[1:]):
+        pieces.append(str(kwargs[field]))
+        pieces.append(literal)
+    return "".join(pieces)
+
+
+# The system prompt is sent as its own message ahead of the screenshot, so that every call
+# shares the same system+image prefix and hits the provider's prompt cache.
+_SYSTEM_PROMPT = "You are an autonomous intelligent agent tasked with navigating a web browser. You will be given web-based tasks to analyze."
+# Providers FoundationModel passes a system message to, as a message, a separate argument (Anthropic),
+# or merged into the first user turn (Fireworks). Prompts of other providers start with the system prompt instead.
+_SYSTEM_MESSAGE_PROVIDERS = ("openai", "anthropic", "anthropic_beta", "fireworks")
+
+_SUMMARIZER_TEMPLATE = 'You are provided a screenshot of a webpage. The task a user is trying to perform on this page is "{task_description}". Here is a list of exact actions which the user has ALREADY performed on the page: {past_actions}. Can you provide a succinct textual summary describing the steps the user has done already in the plan which they would have thought of in order to complete the task?'
+
+_PLANNER_TEMPLATE = "You are provided a screenshot of a webpage for reference. The task a user is trying to perform on this page is \n<task_description>\n{task_description}\n</task_description>\nHere is a summary of what has happened so far: \n <start of summary>\n {summary}\n<end of summary>\nBased on this can you first draft a high level plan of how to solve this task from this step onwards and then provide the textual description of the action the user should take on the current page next? Give the plan, think through it and in the end, provide a one line description of the **next** action enclosed in ```...```. Only output the final answer in ```...``` and no other text. Remember, that the lowest granularity of actions a user can do on a webpage are *clicking* on an html element, *typing* in an html element, *hovering* over an element, pressing a key/combination of keys or scrolling (although you may not need to do this if you can see the whole webpage!). Please note that the description of the next action you provide in ```...``` should only be should only be at an equal OR **higher** level of granularity of planning than this list of individual actions which the user can perform on the webpage. Ie, you can propose more complex tasks than just clicking/hovering, for eg: {low_level_vocab}. You can also perform some computations in memory if that information is already present in the current screenshot instead of suggesting actions to locate/store this information. \nTo reiterate, given the original task description and summary of past actions, suggest the next action which the user should take on the webpage (adhering to the constraints mentioned above)."
+
+_EVALUATOR_TEMPLATE = "You are provided a screenshot of a webpage for reference on which the user is trying to execute statements A and B. They describe an action being taken on an HTML webpage, where A is a textual description and B is potentially describing the actual HTML element which is being acted upon. Are these statements approximately equivalent? Say yes if they are trying to do the same action on a webpage. Statement A is allowed to be more general/broader and B will refer to a more specific user action on the page, but they should generally be capturing the same user intent. A. {predicted_plan}\nB.{gold_plan}. Answer only in Yes/No in the first line. If No, also provide a reason for mismatch in a new line."
+
+_BATCH_EVALUATOR_TEMPLATE = 'You are provided a screenshot of a webpage for reference on which the user is trying to execute the numbered pairs of statements A and B below. They describe an action being taken on an HTML webpage, where A is a textual description and B is potentially describing the actual HTML element which is being acted upon. For each pair, are these statements approximately equivalent? Say yes if they are trying to do the same action on a webpage. Statement A is allowed to be more general/broader and B will refer to a more specific user action on the page, but they should generally be capturing the same user intent. Answer every pair on its own line, starting with the index of the pair in brackets followed by Yes or No, e.g. "[1] Yes". If No, also provide a reason for mismatch on the same line.\n{pairs}'
+
+# Classifies whether the plan is atomic and decomposes it if not, in a single call
+_DECOMPOSE_TEMPLATE = 'Here is a description of a task a user is trying to perform on a webpage: `{final_plan}`. The screenshot of the page you are trying to perform this task is also provided for reference. Can you classify whether this task is "atomic" or not? An atomic task is something a human would consider to be a single action on a webpage. Example of atomic tasks would be to click/hover on a single button or type a string into a html element etc. First answer whether the task is atomic with <atomic>Yes</atomic> or <atomic>No</atomic>. If it is not atomic, further break the task down so that it is "atomic" (only if necessary!, do not make the plan too granular) and output the immediate next step which the user should take. Think step by step and provide a one line description of the next action in the end enclosed in ```...```.'
+
+# Generation budgets of each call: the planner thinks through a plan before its answer, the summary is
+# meant to be succinct, and the evaluator only needs a Yes/No line with a short reason. Decompose
+# reasons step by step before its fenced answer, so it keeps enough room not to be cut off before it.
+_SUMMARIZER_MAX_TOKENS = 256
+_PLANNER_MAX_TOKENS = 1024
+_EVALUATOR_MAX_TOKENS = 64
+_DECOMPOSE_MAX_TOKENS = 512
+# Evaluator and decompose responses are cached across runs, so they are generated greedily for the
+# cached score of a pair to be the one any run would get, rather than whichever sample came first.
+_JUDGE_TEMPERATURE = 0
+
+_NO_PAST_ACTIONS_SUMMARY = "No actions have been performed yet."
+
+_SUMMARIZER_PARTS = _split_template(_SUMMARIZER_TEMPLATE)
+_PLANNER_PARTS = _split_template(
+    _PLANNER_TEMPLATE, low_level_vocab=constants.LOW_LEVEL_ACTIONS_VOCAB
+)
+_EVALUATOR_PARTS = _split_template(_EVALUATOR_TEMPLATE)
+_BATCH_EVALUATOR_PARTS = _split_template(_BATCH_EVALUATOR_TEMPLATE)
+_DECOMPOSE_PARTS = _split_template(_DECOMPOSE_TEMPLATE)
 
 
 class BasicLLMPlanner(Agent):
-    def __init__(self, model_name: str, model_provider: str):
+    def __init__(
+        self,
+        model_name: str,
+        model_provider: str,
+        cache_plans: bool = False,
+        cache_path: Optional[str] = _DEFAULT_RESPONSE_CACHE_PATH,
+    ):
         """
         Base class for an LLM based planner.
+
+        Args:
+        cache_plans (bool): whether to also cache summarizer and planner responses. Evaluator and
+        decompose responses are always cached, since reruns should score the same plan the same way.
+        cache_path (str): SQLite file responses are cached in, or None to only cache them in memory.
         """
+        # Agent.__init__ resets self.model, so it has to run first
+        super().__init__()
         self.model = FoundationModel(name=model_name, provider=model_provider)
+        self.cache_plans = cache_plans
+        self._response_cache = _ResponseCache(cache_path)
 
-        SYSTEM_PROMPT = "You are an autonomous intelligent agent tasked with navigating a web browser. You will be given web-based tasks to analyze."
-
-        self.summarizer = (
-            SYSTEM_PROMPT
-            + 'You are provided a screenshot of a webpage. The task a user is trying to perform on this page is "{task_description}". Here is a list of exact actions which the user has ALREADY performed on the page: {past_actions}. Can you provide a succinct textual summary describing the steps the user has done already in the plan which they would have thought of in order to complete the task?'
-        )
-
-        self.planner = (
-            SYSTEM_PROMPT
-            + "You are provided a screenshot of a webpage for reference. The task a user is trying to perform on this page is \n<task_description>\n{task_description}\n</task_description>\nHere is a summary of what has happened so far: \n <start of summary>\n {summary}\n<end of summary>\nBased on this can you first draft a high level plan of how to solve this task from this step onwards and then provide the textual description of the action the user should take on the current page next? Give the plan, think through it and in the end, provide a one line description of the **next** action enclosed in ```...```. Only output the final answer in ```...``` and no other text. Remember, that the lowest granularity of actions a user can do on a webpage are *clicking* on an html element, *typing* in an html element, *hovering* over an element, pressing a key/combination of keys or scrolling (although you may not need to do this if you can see the whole webpage!). Please note that the description of the next action you provide in ```...``` should only be should only be at an equal OR **higher** level of granularity of planning than this list of individual actions which the user can perform on the webpage. Ie, you can propose more complex tasks than just clicking/hovering, for eg: {low_level_vocab}. You can also perform some computations in memory if that information is already present in the current screenshot instead of suggesting actions to locate/store this information. \nTo reiterate, given the original task description and summary of past actions, suggest the next action which the user should take on the webpage (adhering to the constraints mentioned above)."
-        )
+        self.system_prompt = _SYSTEM_PROMPT
+        # Head of every new conversation, built once and never mutated, since concurrent
+        # async calls share it
+        if self.model.model_provider in _SYSTEM_MESSAGE_PROVIDERS:
+            self._system_messages = ({"role": "system", "content": self.system_prompt},)
+            self._system_prompt_prefix = ""
+        else:
+            self._system_messages = ()
+            self._system_prompt_prefix = self.system_prompt
+        self.summarizer = _SUMMARIZER_TEMPLATE
+        self.planner = _PLANNER_TEMPLATE
+        self.evaluator = _EVALUATOR_TEMPLATE
+        self.batch_evaluator = _BATCH_EVALUATOR_TEMPLATE
+        self.decompose = _DECOMPOSE_TEMPLATE
 
-        self.evaluator = (
-            SYSTEM_PROMPT
-            + "You are provided a screenshot of a webpage for reference on which the user is trying to execute statements A and B. They describe an action being taken on an HTML webpage, where A is a textual description and B is potentially describing the actual HTML element which is being acted upon. Are these statements approximately equivalent? Say yes if they are trying to do the same action on a webpage. Statement A is allowed to be more general/broader and B will refer to a more specific user action on the page, but they should generally be capturing the same user intent. A. {predicted_plan}\nB.{gold_plan}. Answer only in Yes/No in the first line. If No, also provide a reason for mismatch in a new line."
-        )
-
-        self.is_atomic = (
-            SYSTEM_PROMPT
-            + 'Here is a description of a small task you are trying to perform on a webpage: "{final_plan}". Can you classify whether this task is "atomic" or not? An atomic task is something a human would consider to be a single action on a webpage. Example of atomic tasks would be to click/hover on a single button or type a string into a html element etc.  Answer whether the task is atomic in a yes or no.'
-        )
-
-        self.decompose = (
-            SYSTEM_PROMPT
-            + 'Here is a description of a task a user is trying to perform on a webpage: `{final_plan}`. The screenshot of the page you are trying to perform this task is also provided for reference. Can you further break the task down so that it is "atomic". An atomic task is something a human would consider to be a single action on a webpage. Example of atomic tasks would be to click/hover on a single button or type a string into a html element etc. After breaking it down (only if necessary!, do not make the plan too granular), output the immediate next step which the user should take. Think step by step and provide a one line description of the next action in the end enclosed in ```...```.  Only output the final answer in ```...``` and no other text.'
-        )
+        self._summarizer_parts = _SUMMARIZER_PARTS
+        self._planner_parts = _PLANNER_PARTS
+        self._evaluator_parts = _EVALUATOR_PARTS
+        self._batch_evaluator_parts = _BATCH_EVALUATOR_PARTS
+        self._decompose_parts = _DECOMPOSE_PARTS
 
         self.debug_trace = {}
-        super().__init__()
 
     def reset(self, goal, html, screenshot) -> None:
         # Set the current state of the planner.
@@ -53,7 +201,8 @@ class BasicLLMPlanner(Agent):
         # need to handle maintaining trajectory state right
         # now
         self.html_history = [html]
-        self.screenshot_history = [utils.base64_to_image(screenshot)]
+        self.screenshot_history = [base64_to_image(screenshot)]
+        self._screenshot_content = self._image_content(self.screenshot_history[0])
         self.goal = goal
         self.trace = []
         self.debug_trace = {}
@@ -79,31 +228,51 @@ class BasicLLMPlanner(Agent):
         task_description = self.goal
         # Past actions
         past_actions = "\n".join(past_actions)
-        # Load the screenshot
-        screenshot_image = self.screenshot_history[0]
 
         # Define prompts for each step
-        summary = self._simple_prompt(
-            prompt=self.summarizer.format(
+        if past_actions:
+            summarizer_prompt = _render_template(
+                self._summarizer_parts,
                 task_description=task_description,
                 past_actions=past_actions,
-            ),
-            image=screenshot_image,
-        )
-        logging.debug("Summary: ", summary)
+            )
+            summary = self._simple_prompt(
+                prompt=summarizer_prompt,
+                image_content=self._screenshot_content,
+                max_tokens=_SUMMARIZER_MAX_TOKENS,
+                use_cache=self.cache_plans,
+                cache_prompt=True,
+            )
+            logging.debug("Summary: %s", summary)
+
+            # The planner turn continues the summarizer conversation, so its whole prefix,
+            # screenshot and summarizer prompt included, is already in the provider's prompt cache
+            # once the summarizer request is prefilled. A separate warm-up call would not add anything.
+            planner_inputs = dict(
+                history=self._prompt_messages(
+                    summarizer_prompt, self._screenshot_content, cache_prompt=True
+                )
+                + [{"role": "assistant", "content": summary}]
+            )
+        else:
+            # Nothing to summarize at the first step
+            summary = _NO_PAST_ACTIONS_SUMMARY
+            planner_inputs = dict(image_content=self._screenshot_content)
 
         plan = self._simple_prompt(
-            prompt=self.planner.format(
+            prompt=_render_template(
+                self._planner_parts,
                 task_description=task_description,
                 summary=summary,
-                low_level_vocab=str(constants.LOW_LEVEL_ACTIONS_VOCAB),
             ),
-            image=screenshot_image,
+            max_tokens=_PLANNER_MAX_TOKENS,
+            use_cache=self.cache_plans,
+            **planner_inputs,
         )
-        logging.debug("(LLM) Plan: ", plan)
+        logging.debug("(LLM) Plan: %s", plan)
 
         final_plan = self._parse_output(plan)
-        logging.debug("Parsed plan: ", final_plan)
+        logging.debug("Parsed plan: %s", final_plan)
 
         self.debug_trace = {
             "metadata": metadata,
@@ -120,21 +289,46 @@ class BasicLLMPlanner(Agent):
         Optional utility step added to decompose the plan (output of self.act()
         further before evaluation.
         """
-        is_atomic = self._simple_prompt(
-            prompt=self.is_atomic.format(
+        decompose = self._simple_prompt(
+            prompt=_render_template(
+                self._decompose_parts,
                 final_plan=output,
-            )
+            ),
+            image_content=self._screenshot_content,
+            max_tokens=_DECOMPOSE_MAX_TOKENS,
+            temperature=_JUDGE_TEMPERATURE,
+            use_cache=True,
         )
-        if not self._is_yes(is_atomic):
-            decompose = self._simple_prompt(
-                prompt=self.decompose.format(
-                    final_plan=output,
-                ),
-                image=self.screenshot_history[0],
-            )
-            output = self._parse_output(decompose)
+        return self._parse_decompose(output, decompose)
 
-        self.debug_trace["is_atomic"] = is_atomic
+    async def adecompose_before_comparing(self, output: str) -> str:
+        """
+        Asynchronous version of decompose_before_comparing.
+        """
+        decompose = await self._asimple_prompt(
+            prompt=_render_template(
+                self._decompose_parts,
+                final_plan=output,
+            ),
+            image_content=self._screenshot_content,
+            max_tokens=_DECOMPOSE_MAX_TOKENS,
+            temperature=_JUDGE_TEMPERATURE,
+            use_cache=True,
+        )
+        return self._parse_decompose(output, decompose)
+
+    def _parse_decompose(self, output: str, decompose: str) -> str:
+        """
+        Take the decomposed action only if the decompose response explicitly classifies the plan as not atomic
+        and provides the action in a fenced block, otherwise keep the plan.
+        """
+        is_atomic = _ATOMIC_RE.search(decompose)
+        if is_atomic and not self._is_yes(is_atomic.group(1)):
+            decomposed = self._parse_output(decompose)
+            if decomposed is not None:
+                output = decomposed
+
+        self.debug_trace["is_atomic"] = decompose
         self.debug_trace["decomposed_output"] = output
         return output
 
@@ -143,20 +337,109 @@ class BasicLLMPlanner(Agent):
         Returns a score representing plan's success or failure
         """
         is_same = self._simple_prompt(
-            prompt=self.evaluator.format(
+            prompt=_render_template(
+                self._evaluator_parts,
+                predicted_plan=output,
+                gold_plan=label,
+            ),
+            image_content=self._screenshot_content,
+            max_tokens=_EVALUATOR_MAX_TOKENS,
+            temperature=_JUDGE_TEMPERATURE,
+            use_cache=True,
+        )
+        self.debug_trace["llm_eval"] = is_same
+
+        logging.debug("Gold action: %s", label)
+
+        if self._is_yes(is_same):
+            return 1
+        return 0
+
+    async def aevaluate(self, output: str, label: str) -> int:
+        """
+        Asynchronous version of evaluate.
+        """
+        is_same = await self._asimple_prompt(
+            prompt=_render_template(
+                self._evaluator_parts,
                 predicted_plan=output,
                 gold_plan=label,
             ),
-            image=self.screenshot_history[0],
+            image_content=self._screenshot_content,
+            max_tokens=_EVALUATOR_MAX_TOKENS,
+            temperature=_JUDGE_TEMPERATURE,
+            use_cache=True,
         )
         self.debug_trace["llm_eval"] = is_same
 
-        logging.debug("Gold action: ", label)
+        logging.debug("Gold action: %s", label)
 
         if self._is_yes(is_same):
             return 1
         return 0
 
+    def evaluate_many(
+        self, pairs: List[Tuple[str, str]], max_concurrency: int = 8
+    ) -> List[int]:
+        """
+        Score many (output, label) pairs against the current screenshot.
+        The evaluator calls are independent, so up to max_concurrency of them are in flight at once.
+
+        Returns:
+        scores (list), in the same order as pairs.
+        """
+
+        return run_coroutine(
+            gather_with_semaphore(
+                lambda pair: self.aevaluate(*pair), pairs, max_concurrency
+            )
+        )
+
+    def evaluate_batch(
+        self, pairs: List[Tuple[str, str]], b: int = 8, max_concurrency: int = 8
+    ) -> List[int]:
+        """
+        Score many (output, label) pairs against the current screenshot, packing b pairs
+        into each evaluator call. Pairs without an answer in the response are scored by evaluate.
+
+        Returns:
+        scores (list), in the same order as pairs.
+        """
+        batches = [pairs[i : i + b] for i in range(0, len(pairs), b)]
+        responses = run_coroutine(
+            gather_with_semaphore(
+                lambda batch: self._asimple_prompt(
+                    prompt=_render_template(
+                        self._batch_evaluator_parts,
+                        pairs="\n".join(
+                            f"[{i}] A. {output}\nB. {label}"
+                            for i, (output, label) in enumerate(batch, start=1)
+                        ),
+                    ),
+                    image_content=self._screenshot_content,
+                    max_tokens=_EVALUATOR_MAX_TOKENS * len(batch),
+                    temperature=_JUDGE_TEMPERATURE,
+                    use_cache=True,
+                ),
+                batches,
+                max_concurrency,
+            )
+        )
+        self.debug_trace["llm_eval_batch"] = responses
+
+        scores = []
+        for batch, response in zip(batches, responses):
+            answers = {
+                int(index): self._is_yes(answer)
+                for index, answer in _BATCH_ANSWER_RE.findall(response)
+            }
+            for i, (output, label) in enumerate(batch, start=1):
+                if i in answers:
+                    scores.append(1 if answers[i] else 0)
+                else:
+                    scores.append(self.evaluate(output, label))
+        return scores
+
     def _is_yes(self, output: str) -> bool:
         """Return whether a string response indicates 'Yes' or not."""
         if output.lower().startswith("yes"):
@@ -164,41 +447,164 @@ class BasicLLMPlanner(Agent):
         return False
 
     def _parse_output(self, text):
-        # Regular expression to match substrings enclosed in triple backticks
-        pattern = r"```([^`]+)```"
+        # The answer is the last block enclosed in triple backticks, so scan from the end.
+        # When the text has no other backticks before that block, it is also the last regex match.
+        end = text.rfind("```")
+        start = text.rfind("```", 0, end) if end > 0 else -1
+        if start >= 0:
+            block = text[start + 3 : end]
+            if block and "`" not in block and text.find("`", 0, start) < 0:
+                return block
 
         # Find all matches in the input text
-        matches = re.findall(pattern, text)
+        matches = _FENCE_RE.findall(text)
 
         # Return the last match if any matches are found
         return matches[-1] if matches else None
 
+    def _add_cache_breakpoint(self, content: dict) -> dict:
+        if self.model.model_provider == "anthropic":
+            # Anthropic only caches the prompt up to explicit breakpoints
+            content["cache_control"] = {"type": "ephemeral"}
+        return content
+
+    def _image_content(self, image: Image.Image) -> dict:
+        """Encode a screenshot as a JPEG image content item, downscaled to at most _MAX_SCREENSHOT_SIZE."""
+        width, height = image.size
+        scale = _MAX_SCREENSHOT_SIZE / max(width, height)
+        if scale < 1:
+            image = image.resize(
+                (round(width * scale), round(height * scale)), Image.LANCZOS
+            )
+        return self._add_cache_breakpoint(
+            utils.prepare_image_input(image, "JPEG", quality=_SCREENSHOT_JPEG_QUALITY)
+        )
+
+    def _prompt_messages(
+        self,
+        prompt: str,
+        image_content: Optional[dict] = None,
+        role: str = "user",
+        history: Optional[list] = None,
+        cache_prompt: bool = False,
+    ) -> list:
+        if history is None:
+            history = self._system_messages
+            prompt = self._system_prompt_prefix + prompt
+        content = []
+        if image_content:
+            content.append(image_content)
+        text_content = {"type": "text", "text": prompt}
+        if cache_prompt:
+            self._add_cache_breakpoint(text_content)
+        content.append(text_content)
+        return [
+            *history,
+            {
+                "role": role,
+                "content": content,
+            },
+        ]
+
+    def _response_cache_key(
+        self, messages: list, temperature: float, max_tokens: int
+    ) -> str:
+        """Hash everything that determines a response, screenshot bytes included."""
+        return hashlib.blake2b(
+            orjson.dumps(
+                [
+                    self.model.model_provider,
+                    self.model.model_name,
+                    temperature,
+                    max_tokens,
+                    messages,
+                ],
+                option=orjson.OPT_SORT_KEYS,
+            ),
+            digest_size=16,
+        ).hexdigest()
+
+    def _record_cached_response(self, key: str) -> None:
+        """Record in the debug trace that a response, e.g. a score, came from the response cache."""
+        self.debug_trace.setdefault("cached_response_keys", []).append(key)
+
     def _simple_prompt(
         self,
         prompt: str,
-        image: Optional[Image.Image] = None,
+        image_content: Optional[dict] = None,
         role: str = "user",
         temperature: float = 0.7,
         max_tokens: int = 1024,
+        history: Optional[list] = None,
+        use_cache: bool = False,
+        cache_prompt: bool = False,
     ):
         """
+        Args:
+        image_content (dict, optional): image content item to send before the prompt,
+        e.g. self._screenshot_content, which is encoded once per reset.
+        history (list, optional): messages of earlier turns to continue the conversation from.
+        Defaults to a new conversation starting with the system prompt.
+        use_cache (bool): whether to look the response up in, and add it to, the response cache.
+        cache_prompt (bool): whether to put a provider prompt cache breakpoint after the prompt,
+        for calls whose conversation is continued afterwards.
+
         Returns:
         response (str)
         """
-        content = [
-            {"type": "text", "text": prompt},
-        ]
-        if image:
-            content.append(utils.prepare_image_input(np.array(image)))
-        messages = [
-            {
-                "role": role,
-                "content": content,
-            }
-        ]
-        return self.model.generate(
+        messages = self._prompt_messages(
+            prompt, image_content, role, history, cache_prompt
+        )
+        if use_cache:
+            key = self._response_cache_key(messages, temperature, max_tokens)
+            if (response := self._response_cache.get(key)) is not None:
+                self._record_cached_response(key)
+                return response
+
+        response = self.model.generate(
+            messages=messages,
+            max_tokens=max_tokens,
+            return_raw=False,
+            temperature=temperature,
+        )
+        if use_cache and isinstance(response, str):
+            self._response_cache.set(key, response)
+        return response
+
+    async def _asimple_prompt(
+        self,
+        prompt: str,
+        image_content: Optional[dict] = None,
+        role: str = "user",
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+        history: Optional[list] = None,
+        use_cache: bool = False,
+        cache_prompt: bool = False,
+    ):
+        """
+        Asynchronous version of _simple_prompt, going through the provider's async client.
+
+        Returns:
+        response (str)
+        """
+        messages = self._prompt_messages(
+            prompt, image_content, role, history, cache_prompt
+        )
+        if use_cache:
+            key = self._response_cache_key(messages, temperature, max_tokens)
+            # the response cache reads and writes a SQLite file, so it is kept off the event loop
+            response = await asyncio.to_thread(self._response_cache.get, key)
+            if response is not None:
+                self._record_cached_response(key)
+                return response
+
+        response = await self.model.agenerate(
             messages=messages,
             max_tokens=max_tokens,
             return_raw=False,
             temperature=temperature,
         )
+        if use_cache and isinstance(response, str):
+            await asyncio.to_thread(self._response_cache.set, key, response)
+        return response
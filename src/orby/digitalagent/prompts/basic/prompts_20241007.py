@@ -54,27 +54,27 @@ SCREENSHOT_CHANGE_PROMPT = (
 HTML_CHANGE_PROMPT = ("No change in HTML", "HTML changed from this action")
 
 
+def _extend_diff_caches(self):
+    # Each adjacent pair of observations is compared once and cached on the agent,
+    # instead of every time the trace is stringified.
+    for i in range(len(self._screenshot_diff_cache), len(self.screenshot_history) - 1):
+        self._screenshot_diff_cache.append(
+            screenshots_differ(
+                self.screenshot_history[i], self.screenshot_history[i + 1]
+            )
+        )
+    for i in range(len(self._html_diff_cache), len(self.html_history) - 1):
+        self._html_diff_cache.append(self.html_history[i] != self.html_history[i + 1])
+
+
 def _trace_string(self):
     if len(self.trace) > 0:
+        _extend_diff_caches(self)
         # previous action, error, screenshot changed, HTML changed
         trace = "\n".join(
-            str(
-                (
-                    t[0],
-                    t[1],
-                    SCREENSHOT_CHANGE_PROMPT[
-                        int(
-                            screenshots_differ(
-                                self.screenshot_history[i],
-                                self.screenshot_history[i + 1],
-                            )
-                        )
-                    ],
-                    HTML_CHANGE_PROMPT[
-                        int(self.html_history[i] != self.html_history[i + 1])
-                    ],
-                )
-            )
+            f"({t[0]!s}, {t[1]!s}, "
+            f"{SCREENSHOT_CHANGE_PROMPT[int(self._screenshot_diff_cache[i])]}, "
+            f"{HTML_CHANGE_PROMPT[int(self._html_diff_cache[i])]})"
             for i, t in enumerate(self.trace)
         )
         trace_string = TRACE_PROMPT.format(trace=trace)
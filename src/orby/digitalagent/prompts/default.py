@@ -8,7 +8,7 @@ basic_stateless = Template(
     os.path.join(os.path.dirname(__file__), "basic_stateless", "20241031.jinja2")
 )
 hierarchical_stateless = Template(
-    os.path.join(os.path.dirname(__file__), "hierarchical_stateless", "20241031.jinja2")
+    os.path.join(os.path.dirname(__file__), "hierarchical_stateless", "20261017.jinja2")
 )
 hierarchical_stateless_multi = Template(
     os.path.join(
@@ -5,23 +5,25 @@ from orby.digitalagent.prompts.hierarchical_stateless.prompts_20241007 import (
 
 
 def final_grounding_verifier_prompt(current_screenshot, prev_screenshot):
-    prompt = """You are a powerful and precise web agent, executing the following goal: {goal}.
-Another web agent has performed operations to achieve this goal, and your task is to verify whether the goal has been achieved. The user will provide the webpage and html, which the agent must operate on using the actions to perform your goal. Your final output should be concisely either "Yes" or "No"."""
-    prompt += "\n\nHuman: "
+    parts = [
+        """You are a powerful and precise web agent, executing the following goal: {goal}.
+Another web agent has performed operations to achieve this goal, and your task is to verify whether the goal has been achieved. The user will provide the webpage and html, which the agent must operate on using the actions to perform your goal. Your final output should be concisely either "Yes" or "No".""",
+        "\n\nHuman: ",
+    ]
     images = {}
 
-    prompt += (
+    parts.append(
         "This is the screenshot before the previous action was taken by the agent. "
         "Carefully compare this with the current screenshot to understand if the previous action achieved the intended effect. <image_prev_screenshot>"
     )
     images["prev_screenshot"] = prev_screenshot
 
-    prompt += """Here is the current image of the webpage:<image_screenshot>"""
+    parts.append("""Here is the current image of the webpage:<image_screenshot>""")
     images["screenshot"] = current_screenshot
 
-    prompt += """Next, here is the HTML content of the webpage.
-{html}"""
+    parts.append("""Next, here is the HTML content of the webpage.
+{html}""")
 
-    prompt += """Has the goal been successfully achieved? Answer "Yes" or "No"."""
+    parts.append("""Has the goal been successfully achieved? Answer "Yes" or "No".""")
 
-    return prompt, images
+    return "".join(parts), images
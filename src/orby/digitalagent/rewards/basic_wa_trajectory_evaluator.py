@@ -1,12 +1,14 @@
 from typing import Any, Dict, Optional, Union, List, Tuple, Callable
 from abc import ABCMeta, abstractmethod
+import functools
 import io
-import json
+import orjson
 from PIL import Image
-import numpy as np
 import pandas as pd
 import random
+import re
 import jinja2
+import xxhash
 
 from orby.digitalagent.model.fm import FoundationModel
 from orby.digitalagent.agent.utils import prompt_to_messages
@@ -14,6 +16,49 @@ from orby.protos.fm.trajectory_data_pb2 import TrajectoryData
 from orby.digitalagent.rewards import prompts, trajectory_utils
 from orby.digitalagent.rewards import TrajectoryEvaluator
 
+# Peels an optional ```json ... ``` fence off the JSON object in the verifier response
+_FENCE_RE = re.compile(r"^\s*`*\s*(?:json)?\s*(\{.*\})\s*`*\s*$", re.DOTALL)
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_template(prompt_template: str) -> jinja2.Template:
+    """Compile a prompt template once, shared by all evaluators using the same template."""
+    return jinja2.Template(prompt_template)
+
+
+def _format_steps(traj: TrajectoryData) -> str:
+    """
+    Format the agent response of every step of a trajectory for the `steps_str` template variable.
+    Building this in Python is much faster than a Jinja loop resolving the attributes per step.
+    """
+    parts = []
+    for i, action in enumerate(traj.actions, start=1):
+        interactions = action.agent_state.llm_interactions
+        response = interactions[-1].response if interactions else ""
+        parts.append(f"\n    Step {i}: {response}\n")
+    return "".join(parts)
+
+
+# Screenshots are sent downscaled to the largest side vision models accept, and as WebP,
+# which is several times smaller on the wire than PNG at comparable quality.
+_MAX_SCREENSHOT_SIZE = 2048
+_IMAGE_SAVE_KWARGS = {
+    "WEBP": {"quality": 85, "method": 4},
+    "JPEG": {"quality": 85},
+    "PNG": {},
+}
+
+
+def _decode_screenshot(content: bytes) -> Image.Image:
+    """
+    Decode a screenshot, downscaled to fit _MAX_SCREENSHOT_SIZE. For JPEGs, thumbnail lets
+    libjpeg-turbo scale while decoding instead of decoding the full image first.
+    """
+    image = Image.open(io.BytesIO(content))
+    image.thumbnail((_MAX_SCREENSHOT_SIZE, _MAX_SCREENSHOT_SIZE), Image.LANCZOS)
+    image.load()
+    return image
+
 
 class BasicWATrajectoryEvaluator(TrajectoryEvaluator):
     def __init__(
@@ -24,22 +69,34 @@ class BasicWATrajectoryEvaluator(TrajectoryEvaluator):
         check_gt_success: Callable[
             TrajectoryData, bool
         ] = trajectory_utils.check_wa_traj_success,
+        image_format: str = "WEBP",
     ):
+        """
+        Args:
+            image_format (str): Format screenshots are sent to the model in, one of "WEBP",
+                "JPEG" or "PNG". Use "JPEG" for model providers that do not accept WebP.
+        """
         TrajectoryEvaluator.__init__(self)
         self.model_configs = model_configs
         self.model = FoundationModel(**model_configs) if model_configs else None
         self.prompt_template = prompt_template
         self.image_sequence_idx = image_sequence_idx
         self.check_gt_success = check_gt_success
+        self.image_format = image_format
 
     def evaluate(
         self,
         traj: TrajectoryData,
+        gt_success: Optional[bool] = None,
         **kwargs,
     ):
         """
         Evaluate a single trajectory using one LLM call.
+        If the ground truth success of the trajectory is already known, e.g. from sampling,
+        pass it as gt_success to skip calling check_gt_success again.
         """
+        if gt_success is None:
+            gt_success = self.check_gt_success(traj)
         messages = self._construct_llm_messages(traj, **kwargs)
         try:
             response = self.model.generate(messages=messages)
@@ -51,7 +108,7 @@ class BasicWATrajectoryEvaluator(TrajectoryEvaluator):
         return {
             "llm_request_prompt": messages,
             "llm_response": response,
-            "gt_success": self.check_gt_success(traj),
+            "gt_success": gt_success,
             "llm_pred_success": success,
             "llm_pred_answer": answer,
         }
@@ -64,11 +121,18 @@ class BasicWATrajectoryEvaluator(TrajectoryEvaluator):
         """
         Construct the messages for the LLM call by rendering the jinja2 template and get the image sequence.
         """
-        prompt_text = jinja2.Template(self.prompt_template).render(traj=traj, **kwargs)
+        prompt_text = _compile_template(self.prompt_template).render(
+            traj=traj, steps_str=_format_steps(traj), **kwargs
+        )
         images = self._extract_screenshot_sequence_from_traj(
             traj=traj, sequence_idx=self.image_sequence_idx
         )
-        messages = prompt_to_messages(prompt_text, images=images)
+        messages = prompt_to_messages(
+            prompt_text,
+            images=images,
+            image_format=self.image_format,
+            image_save_kwargs=_IMAGE_SAVE_KWARGS[self.image_format],
+        )
         return messages
 
     def _parse_llm_response(
@@ -84,11 +148,21 @@ class BasicWATrajectoryEvaluator(TrajectoryEvaluator):
         Returns:
             tuple[bool, str]: A tuple containing the success status and the answer, if any.
         """
-        response = response.strip("`").strip("json").strip().replace("\n", " ")
+        match = _FENCE_RE.match(response)
+        payload = match.group(1) if match else response
+        payload = payload.replace("\n", " ")
         try:
-            response_dict = json.loads(response)
-        except json.JSONDecodeError:
-            response_dict = json.loads(response.strip("`").strip("json").strip())
+            response_dict = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # the object may be surrounded by other text, try once with just the outermost braces
+            try:
+                response_dict = orjson.loads(
+                    payload[payload.find("{") : payload.rfind("}") + 1]
+                )
+            except orjson.JSONDecodeError:
+                response_dict = {}
+        if not isinstance(response_dict, dict):
+            response_dict = {}
         success = "yes" in response_dict.get("success", "").lower()
         answer = response_dict.get("answer", {})
         return success, answer
@@ -97,7 +171,7 @@ class BasicWATrajectoryEvaluator(TrajectoryEvaluator):
         self,
         traj: TrajectoryData,
         sequence_idx: List[int] = None,
-    ) -> Dict[str, np.ndarray]:
+    ) -> Dict[str, Image.Image]:
         """
         Extract screenshots from a trajectory based on the sequence type.
 
@@ -106,15 +180,28 @@ class BasicWATrajectoryEvaluator(TrajectoryEvaluator):
             sequence_type (str): Type of sequence to extract.
                 - "first_last": Returns the first and last screenshots.
         Returns:
-            Dict[str, np.ndarray]:
+            Dict[str, Image.Image]:
         """
-        all_states = [
-            traj.actions[i].before_state for i in range(len(traj.actions))
-        ] + [traj.actions[-1].after_state]
-        screenshots = {
-            str(i): all_states[i].viewport.screenshot.content for i in sequence_idx
-        }
+        # states are the before_state of every action followed by the after_state of the last
+        # one, indexed like a list, without building that list for the few indices needed
+        num_states = len(traj.actions) + 1
+
+        def state(i: int):
+            if not -num_states <= i < num_states:
+                raise IndexError(f"state index {i} out of range")
+            i %= num_states
+            if i == num_states - 1:
+                return traj.actions[-1].after_state
+            return traj.actions[i].before_state
+
         screenshots = {
-            k: np.array(Image.open(io.BytesIO(s))) for k, s in screenshots.items()
+            str(i): state(i).viewport.screenshot.content for i in sequence_idx
         }
+        # unchanged pages store the same screenshot bytes in several states, decode those once
+        decoded = {}
+        for k, s in screenshots.items():
+            h = xxhash.xxh3_64_intdigest(s)
+            if h not in decoded:
+                decoded[h] = _decode_screenshot(s)
+            screenshots[k] = decoded[h]
         return screenshots
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import Any, Dict, Optional, Union, List, Tuple
 
@@ -23,11 +24,13 @@ def calculate_metrics(
     results = (
         pd.DataFrame(results) if not isinstance(results, pd.DataFrame) else results
     )
-    # Confusion matrix components
-    tp = results[results[gt_col] & results[pred_col]].shape[0]
-    tn = results[(~results[gt_col]) & (~results[pred_col])].shape[0]
-    fp = results[(~results[gt_col]) & results[pred_col]].shape[0]
-    fn = results[(results[gt_col]) & (~results[pred_col])].shape[0]
+    # Confusion matrix components, counted on the raw boolean arrays instead of filtered DataFrames
+    gt = results[gt_col].to_numpy(dtype=bool)
+    pred = results[pred_col].to_numpy(dtype=bool)
+    tp = int(np.count_nonzero(gt & pred))
+    fp = int(np.count_nonzero(~gt & pred))
+    fn = int(np.count_nonzero(gt & ~pred))
+    tn = len(gt) - tp - fp - fn
 
     # Derived metrics
     precision = tp / (tp + fp) if (tp + fp) > 0 else 0.0
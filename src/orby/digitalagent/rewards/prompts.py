@@ -9,9 +9,7 @@ The goal can be a question or a task that the player is trying to complete.
 The goal of the task is: {{traj.goal}}
 
 The player has taken the following actions (including the chain-of-thought, the action, and the description):
-{% for action in traj.actions %}
-    Step {{ loop.index }}: {{action.agent_state.llm_interactions[-1].response}}
-{% endfor %}
+{{steps_str}}
 The url of the current screenshot: {{traj.actions[-1].after_state.url}}
 The current screenshot: <image:-1>
 
@@ -1,10 +1,12 @@
 from typing import Any, Dict, Optional, Union, List, Tuple
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 import io
 import json
 from PIL import Image
 import numpy as np
 import random
+import threading
 
 from orby.protos.fm.trajectory_data_pb2 import TrajectoryData
 from orby.digitalagent.utils import file_utils
@@ -25,19 +27,43 @@ class TrajectoryEvaluator:
         self,
         s3_paths: List[str],
         run_id: str = "test",
+        max_workers: int = 16,
+        max_prefetch: int = 32,
+        traj_bytes: Optional[Dict[str, bytes]] = None,
     ) -> Tuple[List[Dict], Dict]:
         """
         Run the LLM evaluator on a batch of trajectories, get the results and calculate metrics.
+        Up to max_workers trajectories are evaluated in parallel threads, while a separate pool
+        downloads up to max_prefetch trajectories ahead of them, so that evaluations do not wait
+        behind S3 reads. Results keep the order of s3_paths.
+        Trajectories in traj_bytes, e.g. filled by sample_traj_from_s3_folder, are not downloaded
+        again, and are removed from it once loaded.
         """
-        # TODO: make it multi-thread
-        results = []
-        for path in s3_paths:
-            traj = trajectory_utils.load_traj_from_s3_path(path)
-            output = self.evaluate(traj)
-            results.append(
-                {
-                    "s3_path": path,
-                    **output,
-                }
-            )
-        return results
+        # bounds the number of trajectories held in memory, loaded or being evaluated
+        slots = threading.BoundedSemaphore(max_workers + max_prefetch)
+
+        def evaluate_loaded(path: str, load: Future) -> Dict:
+            try:
+                return self._evaluate_traj(path, load.result())
+            finally:
+                slots.release()
+
+        loader = ThreadPoolExecutor(max_workers=max_prefetch)
+        evaluator = ThreadPoolExecutor(max_workers=max_workers)
+        with loader, evaluator:
+            futures = []
+            for path in s3_paths:
+                slots.acquire()
+                content = traj_bytes.pop(path, None) if traj_bytes else None
+                load = loader.submit(
+                    trajectory_utils.load_traj_from_s3_path, path, content
+                )
+                futures.append(evaluator.submit(evaluate_loaded, path, load))
+            return [future.result() for future in futures]
+
+    def _evaluate_traj(self, path: str, traj: TrajectoryData) -> Dict:
+        output = self.evaluate(traj)
+        return {
+            "s3_path": path,
+            **output,
+        }
@@ -1,4 +1,6 @@
-from typing import Any, Dict, Optional, Union, List, Tuple, Callable
+from typing import Any, Dict, Iterator, Optional, Union, List, Tuple, Callable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import random
 
 from orby.protos.fm.trajectory_data_pb2 import TrajectoryData
@@ -12,10 +14,52 @@ def check_wa_traj_success(traj: TrajectoryData) -> bool:
     return True if traj.success.answer else False
 
 
-def load_traj_from_s3_path(s3_path: str):
+def _read_traj_bytes(s3_path: str) -> bytes:
     with file_utils.open(s3_path, "rb") as f:
-        traj = TrajectoryData.FromString(f.read())
-    return traj
+        return f.read()
+
+
+def load_traj_from_s3_path(s3_path: str, content: Optional[bytes] = None):
+    """
+    Load a trajectory from S3, or from its serialized bytes if they were already downloaded,
+    e.g. by sample_traj_from_s3_folder.
+    """
+    if content is None:
+        content = _read_traj_bytes(s3_path)
+    return TrajectoryData.FromString(content)
+
+
+def _check_traj_success(
+    s3_path: str, success_check_func: Callable[[TrajectoryData], bool]
+) -> Tuple[bool, bytes]:
+    content = _read_traj_bytes(s3_path)
+    return success_check_func(TrajectoryData.FromString(content)), content
+
+
+def _iter_traj_success(
+    s3_paths: List[str],
+    success_check_func: Callable[[TrajectoryData], bool],
+    max_workers: int,
+) -> Iterator[Tuple[str, Tuple[bool, bytes]]]:
+    """
+    Yield (s3_path, (success, serialized trajectory)) in the order of s3_paths, while loading
+    up to max_workers trajectories ahead in a thread pool. Loads still pending when the caller stops iterating
+    are cancelled, so only about max_workers trajectories are fetched beyond the last one used.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for s3_path in s3_paths:
+            future = executor.submit(_check_traj_success, s3_path, success_check_func)
+            pending.append((s3_path, future))
+            if len(pending) >= max_workers:
+                s3_path, future = pending.popleft()
+                yield s3_path, future.result()
+        while pending:
+            s3_path, future = pending.popleft()
+            yield s3_path, future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def sample_traj_from_s3_folder(
@@ -24,16 +68,20 @@ def sample_traj_from_s3_folder(
     success_ratio: Optional[float] = None,
     success_check_func: Callable[[TrajectoryData], bool] = check_wa_traj_success,
     seed: int = 42,
+    max_workers: int = 16,
+    traj_bytes: Optional[Dict[str, bytes]] = None,
 ) -> List[str]:
     """
     Sample trajectories from a given S3 folder, following the rules:
     (1) Sample all trajectories if num_samples is None;
     (2) Randomly sample num_samples trajectories if specified;
     (3) Randomly sample with a given success_ratio if specified.
+    For (3), trajectories are loaded with max_workers threads to check their success. If traj_bytes
+    is given, the serialized sampled trajectories are added to it by S3 path, so that they can be
+    passed on to load_traj_from_s3_path or batch_evaluate instead of being downloaded again.
     Returns a list of S3 paths.
     """
-    objects = file_utils.list_files(s3_folder)
-    protos = [o for o in objects if o.endswith(".pb")]
+    protos = list(file_utils.list_files(s3_folder, suffix=".pb"))
     print(f"Found {len(protos)} trajectory protos.")
     random.seed(seed)
     random.shuffle(protos)
@@ -52,14 +100,17 @@ def sample_traj_from_s3_folder(
     required_failed_count = num_samples - required_success_count
 
     successful_protos, failed_protos = [], []
-    for proto in protos:
-        traj = load_traj_from_s3_path(proto)
-        if success_check_func(traj) and len(successful_protos) < required_success_count:
+    for proto, (success, content) in _iter_traj_success(
+        protos, success_check_func, max_workers
+    ):
+        if success and len(successful_protos) < required_success_count:
             successful_protos.append(proto)
-        elif (
-            not success_check_func(traj) and len(failed_protos) < required_failed_count
-        ):
+        elif not success and len(failed_protos) < required_failed_count:
             failed_protos.append(proto)
+        else:
+            continue
+        if traj_bytes is not None:
+            traj_bytes[proto] = content
         # stop when reaching the desired counts for both
         if (
             len(successful_protos) == required_success_count
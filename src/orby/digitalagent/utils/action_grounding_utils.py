@@ -1,31 +1,17 @@
+import asyncio
+import collections
+import io
+import json
 import re
-from openai import OpenAI
+import threading
+import numpy as np
+from openai import AsyncOpenAI, OpenAI
+from PIL import Image
 
 import orby.digitalagent.utils.eval_utils as eval_utils
 import orby.digitalagent.utils.image_utils as image_utils
 
-
-def get_action_description_from_gpt_4o(
-    client: OpenAI,
-    image: bytes,
-    bbox_xywh: tuple[float, float, float, float],
-) -> str:
-    """
-    Using GPT-4v, generate a description of the action based on the image and bounding box.
-
-    Args:
-        client (OpenAI): The OpenAI client
-        image (bytes): The image as bytes
-        bbox (tuple[float, float, float, float]): The bounding box in the format (x, y, w, h)
-            x and y are the coordinates of the top-left corner, and w and h are the width and height.
-
-    Returns:
-        str: The description of the action
-    """
-    bbox_xyxy = image_utils.convert_bbox_xywh_to_xyxy(bbox_xywh)
-    image_pil = image_utils.convert_image_bytes_to_pil_image(image)
-    image_utils.draw_red_arrow(image_pil, bbox_xyxy)
-    prompt = """\
+_ACTION_DESCRIPTION_PROMPT = """\
 You are a superhuman AI that can navigate the web and understand user intentions.
 You have been given the screenshot of a webpage before a user conduct an ACTION over an ELEMENT on the webpage.
 The element is highlighted in a red bounding box and pointed to by a red arrow.
@@ -48,6 +34,61 @@ Please do NOT output anything else. Please do NOT decorate the output with any a
 
 Answer: \
 """
+
+# Regular expression to match coordinates (float, float)
+_COORDINATES_RE = re.compile(r"\(\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*\)")
+
+
+def _decode_image(image: bytes) -> Image.Image:
+    image_pil = image_utils.convert_image_bytes_to_pil_image(image)
+    if image_pil.mode != "RGB":
+        image_pil = image_pil.convert("RGB")
+    image_pil.load()
+    return image_pil
+
+
+class _DecodedImages:
+    """
+    Decoded images of a batch of requests, so that an image with several bounding boxes to describe
+    is decoded once. Each decoded image is dropped as soon as the last request on it is built.
+    """
+
+    def __init__(self, images: list[bytes]):
+        self._remaining = collections.Counter(images)
+        self._decoded: dict[bytes, Image.Image] = {}
+        self._lock = threading.Lock()
+
+    def get_copy(self, image: bytes) -> Image.Image:
+        """Get a copy of the decoded image, which can be drawn on."""
+        with self._lock:
+            decoded = self._decoded.get(image)
+        if decoded is None:
+            decoded = _decode_image(image)
+        with self._lock:
+            self._remaining[image] -= 1
+            if self._remaining[image] > 0:
+                self._decoded[image] = decoded
+            else:
+                del self._remaining[image]
+                self._decoded.pop(image, None)
+        return decoded.copy()
+
+
+def _action_description_request(
+    image: bytes,
+    bbox_xywh: tuple[float, float, float, float],
+    decoded_images: _DecodedImages | None = None,
+) -> dict:
+    """
+    Build the chat completion arguments asking GPT-4o to describe the action on a bounding box.
+    The bounding box is marked on the image with a red arrow.
+    """
+    bbox_xyxy = image_utils.convert_bbox_xywh_to_xyxy(bbox_xywh)
+    if decoded_images is not None:
+        image_pil = decoded_images.get_copy(image)
+    else:
+        image_pil = _decode_image(image)
+    image_utils.draw_red_arrow(image_pil, bbox_xyxy)
     content = []
     content.append(
         {
@@ -58,21 +99,116 @@ Answer: \
             },
         }
     )
-    content.append({"type": "text", "text": prompt})
-    response = client.chat.completions.create(
-        model="gpt-4o-2024-08-06",
-        messages=[
+    content.append({"type": "text", "text": _ACTION_DESCRIPTION_PROMPT})
+    return {
+        "model": "gpt-4o-2024-08-06",
+        "messages": [
             {
                 "role": "user",
                 "content": content,
             }
         ],
-        temperature=0,
-        max_tokens=300,
+        "temperature": 0,
+        "max_tokens": 300,
+    }
+
+
+def get_action_description_from_gpt_4o(
+    client: OpenAI,
+    image: bytes,
+    bbox_xywh: tuple[float, float, float, float],
+) -> str:
+    """
+    Using GPT-4v, generate a description of the action based on the image and bounding box.
+
+    Args:
+        client (OpenAI): The OpenAI client
+        image (bytes): The image as bytes
+        bbox (tuple[float, float, float, float]): The bounding box in the format (x, y, w, h)
+            x and y are the coordinates of the top-left corner, and w and h are the width and height.
+
+    Returns:
+        str: The description of the action
+    """
+    response = client.chat.completions.create(
+        **_action_description_request(image, bbox_xywh)
     )
     return response.choices[0].message.content
 
 
+async def get_action_descriptions_from_gpt_4o_batch(
+    client: AsyncOpenAI,
+    items: list[tuple[bytes, tuple[float, float, float, float]]],
+    max_concurrency: int = 32,
+) -> list[str]:
+    """
+    Asynchronous, batched version of get_action_description_from_gpt_4o, for grounding many
+    images at once. Up to max_concurrency requests are in flight at the same time, and images
+    are prepared in worker threads so that encoding them does not block the event loop.
+
+    Args:
+        client (AsyncOpenAI): The asynchronous OpenAI client, shared by all requests
+        items (list[tuple[bytes, tuple[float, float, float, float]]]): (image, bbox_xywh) pairs,
+            as taken by get_action_description_from_gpt_4o
+        max_concurrency (int): The maximum number of concurrent requests. Default is 32.
+
+    Returns:
+        list[str]: The descriptions of the actions, in the order of items
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    decoded_images = _DecodedImages([image for image, _ in items])
+
+    async def describe(image, bbox_xywh):
+        async with semaphore:
+            request = await asyncio.to_thread(
+                _action_description_request, image, bbox_xywh, decoded_images
+            )
+            response = await client.chat.completions.create(**request)
+        return response.choices[0].message.content
+
+    return await asyncio.gather(
+        *(describe(image, bbox_xywh) for image, bbox_xywh in items)
+    )
+
+
+def submit_action_descriptions_batch(
+    client: OpenAI,
+    items: list[tuple[bytes, tuple[float, float, float, float]]],
+):
+    """
+    Submit the requests of get_action_description_from_gpt_4o for many images as an OpenAI
+    batch job, for offline runs that can wait up to 24 hours at half the price. The custom_id
+    of each request in the batch output is the index of its item.
+
+    Args:
+        client (OpenAI): The OpenAI client
+        items (list[tuple[bytes, tuple[float, float, float, float]]]): (image, bbox_xywh) pairs,
+            as taken by get_action_description_from_gpt_4o
+
+    Returns:
+        Batch: The created batch job
+    """
+    requests = io.BytesIO()
+    decoded_images = _DecodedImages([image for image, _ in items])
+    for i, (image, bbox_xywh) in enumerate(items):
+        request = {
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _action_description_request(image, bbox_xywh, decoded_images),
+        }
+        requests.write(json.dumps(request).encode())
+        requests.write(b"\n")
+    batch_input_file = client.files.create(
+        file=("action_descriptions.jsonl", requests.getvalue()), purpose="batch"
+    )
+    return client.batches.create(
+        input_file_id=batch_input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+
+
 def extract_coordinates_from_string(sentence: str) -> tuple[float, float] | None:
     """
     Locate the first occurrence of a pair of coordinates in a string and return them
@@ -85,11 +221,8 @@ def extract_coordinates_from_string(sentence: str) -> tuple[float, float] | None
         Optional[tuple[float, float]]: The coordinates as a tuple of floats if found,
             else None
     """
-    # Regular expression to match coordinates (float, float)
-    coordinate_pattern = r"\(\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*\)"
-
     # Search for the first occurrence of the pattern
-    match = re.search(coordinate_pattern, sentence)
+    match = _COORDINATES_RE.search(sentence)
 
     # If a match is found, return the tuple of floats, else return None
     if match:
@@ -114,14 +247,15 @@ def rouge_1_f1_metric(prediction: str | None, label: str | None) -> float:
         return 0.0
 
     # Tokenize the prediction and label
-    prediction_tokens = set(prediction.split())
-    label_tokens = set(label.split())
+    prediction_tokens = frozenset(prediction.split())
+    label_tokens = frozenset(label.split())
+    if not prediction_tokens or not label_tokens:
+        return 0.0
 
     # Calculate precision, recall, and F1 score
-    precision = len(prediction_tokens.intersection(label_tokens)) / len(
-        prediction_tokens
-    )
-    recall = len(prediction_tokens.intersection(label_tokens)) / len(label_tokens)
+    num_common_tokens = len(prediction_tokens & label_tokens)
+    precision = num_common_tokens / len(prediction_tokens)
+    recall = num_common_tokens / len(label_tokens)
     f1_score = (
         (2 * precision * recall) / (precision + recall) if precision + recall > 0 else 0
     )
@@ -129,6 +263,59 @@ def rouge_1_f1_metric(prediction: str | None, label: str | None) -> float:
     return f1_score
 
 
+def _token_hashes(text: str | None) -> np.ndarray:
+    """Hash the distinct whitespace-separated tokens of a text to a sorted int64 array."""
+    if not text:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.fromiter(map(hash, text.split()), dtype=np.int64))
+
+
+def rouge_1_f1_metric_batch(
+    predictions: list[str | None], labels: list[str | None]
+) -> np.ndarray:
+    """
+    Batched version of rouge_1_f1_metric. Tokens are compared by hash, as sorted int64 arrays
+    instead of sets of strings, and the scores are computed for the whole batch at once.
+
+    Args:
+        predictions (list[str | None]): The predicted texts
+        labels (list[str | None]): The ground truth texts
+
+    Returns:
+        np.ndarray: The ROUGE score between each prediction and label
+    """
+    n = len(predictions)
+    num_prediction_tokens = np.zeros(n)
+    num_label_tokens = np.zeros(n)
+    num_common_tokens = np.zeros(n)
+    for i, (prediction, label) in enumerate(zip(predictions, labels)):
+        prediction_tokens = _token_hashes(prediction)
+        label_tokens = _token_hashes(label)
+        num_prediction_tokens[i] = prediction_tokens.size
+        num_label_tokens[i] = label_tokens.size
+        num_common_tokens[i] = np.intersect1d(
+            prediction_tokens, label_tokens, assume_unique=True
+        ).size
+
+    # 2PR / (P + R) simplifies to 2C / (|prediction| + |label|), and is 0 without common tokens
+    return np.divide(
+        2 * num_common_tokens,
+        num_prediction_tokens + num_label_tokens,
+        out=np.zeros(n),
+        where=num_common_tokens > 0,
+    )
+
+
+def _texts_match(label: str | None, prediction: str | None) -> bool:
+    """
+    Whether a label and a prediction without a bounding box or point, e.g. both saying that no
+    element was found, are substrings of each other. Empty texts never match.
+    """
+    if not label or not prediction:
+        return False
+    return (label in prediction) or (prediction in label)
+
+
 def within_bbox_metric(
     bbox_label: tuple[float, float, float, float] | str,
     point_prediction: tuple[float, float] | str,
@@ -152,17 +339,18 @@ def within_bbox_metric(
     Returns:
         bool: True if the point is within the bounding box, else False
     """
+    label_text = prediction_text = None
     if isinstance(bbox_label, str):
-        bbox_label = bbox_label.strip().lower()
-        bbox_label = eval_utils.extract_bbox_from_string(bbox_label)
+        label_text = bbox_label.strip().lower()
+        bbox_label = eval_utils.extract_bbox_from_string(label_text)
     if isinstance(point_prediction, str):
-        point_prediction = point_prediction.strip().lower()
-        point_prediction = extract_coordinates_from_string(point_prediction)
+        prediction_text = point_prediction.strip().lower()
+        point_prediction = extract_coordinates_from_string(prediction_text)
 
     if bbox_label is None and point_prediction is None:
         # if both are None, it means that the predicted and actual answer may
         # indicate no element found
-        return (bbox_label in point_prediction) or (point_prediction in bbox_label)
+        return _texts_match(label_text, prediction_text)
 
     if bbox_label is None or point_prediction is None:
         return False
@@ -176,6 +364,67 @@ def within_bbox_metric(
     return x1 <= x <= x2 and y1 <= y <= y2
 
 
+def within_bbox_metric_batch(
+    bbox_labels: list[tuple[float, float, float, float] | str],
+    point_predictions: list[tuple[float, float] | str],
+    bbox_format: str = "xyxy",
+) -> np.ndarray:
+    """
+    Batched version of within_bbox_metric. The labels and predictions are parsed once, and the
+    containment test runs as a single vectorized comparison over all of them.
+
+    Args:
+        bbox_labels (list[tuple[float, float, float, float] | str]): The bounding boxes as tuples
+            of floats or strings
+        point_predictions (list[tuple[float, float] | str]): The points as tuples of floats or strings
+        bbox_format (str): The format of the bounding boxes, either "xyxy" or "xywh".
+            Default is 'xyxy'.
+
+    Returns:
+        np.ndarray: A boolean array, True where the point is within the bounding box
+    """
+    n = len(bbox_labels)
+    bboxes = np.full((n, 4), np.nan)
+    points = np.full((n, 2), np.nan)
+    # samples where neither a bounding box nor a point is found fall back to comparing the texts, like
+    # within_bbox_metric does
+    result = np.zeros(n, dtype=bool)
+    for i, (bbox_label, point_prediction) in enumerate(
+        zip(bbox_labels, point_predictions)
+    ):
+        label_text = prediction_text = None
+        if isinstance(bbox_label, str):
+            label_text = bbox_label.strip().lower()
+            bbox = eval_utils.extract_bbox_from_string(label_text)
+        else:
+            bbox = bbox_label
+        if isinstance(point_prediction, str):
+            prediction_text = point_prediction.strip().lower()
+            point = extract_coordinates_from_string(prediction_text)
+        else:
+            point = point_prediction
+        if bbox is None and point is None:
+            result[i] = _texts_match(label_text, prediction_text)
+            continue
+        if bbox is not None:
+            bboxes[i] = bbox
+        if point is not None:
+            points[i] = point
+
+    if bbox_format == "xywh":
+        bboxes[:, 2:] += bboxes[:, :2]
+
+    # comparisons with NaN are False, so samples missing only one of the two are incorrect
+    x, y = points[:, 0], points[:, 1]
+    within = (
+        (bboxes[:, 0] <= x)
+        & (x <= bboxes[:, 2])
+        & (bboxes[:, 1] <= y)
+        & (y <= bboxes[:, 3])
+    )
+    return result | within
+
+
 def within_bbox_0_to_999_coordinates_metric(
     label: str,
     prediction: str,
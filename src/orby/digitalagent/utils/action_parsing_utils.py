@@ -1,50 +1,59 @@
 import ast
 import dataclasses
+import functools
 import re
 
 from browsergym.core.action.parsers import _build_highlevel_action_parser
 
 
-NOOP_ACTIONS = ["noop"]
-SCROLL_ACTIONS = ["scroll"]
-NO_PARAMETERS_ACTIONS = [
-    "go_back",
-    "go_forward",
-    "tab_close",
-    "new_tab",
-]
-VALUE_ONLY_ACTIONS = [
-    "send_msg_to_user",
-    "report_infeasible",
-    "keyboard_down",
-    "keyboard_up",
-    "keyboard_press",
-    "keyboard_type",
-    "keyboard_insert_text",
-    "goto",
-    "tab_focus",
-]
-BID_ACTIONS = [
-    "fill",
-    "select_option",
-    "click",
-    "dblclick",
-    "hover",
-    "press",
-    "focus",
-    "clear",
-    "upload_file",
-]
-COORDINATE_ACTIONS = [
-    "mouse_move",
-    "mouse_up",
-    "mouse_down",
-    "mouse_click",
-    "mouse_dblclick",
-    "mouse_upload_file",
-]
-MULTI_BID_ACTIONS = ["drag_and_drop"]
-MULTI_COORDINATE_ACTIONS = ["mouse_drag_and_drop"]
+NOOP_ACTIONS = frozenset({"noop"})
+SCROLL_ACTIONS = frozenset({"scroll"})
+NO_PARAMETERS_ACTIONS = frozenset(
+    {
+        "go_back",
+        "go_forward",
+        "tab_close",
+        "new_tab",
+    }
+)
+VALUE_ONLY_ACTIONS = frozenset(
+    {
+        "send_msg_to_user",
+        "report_infeasible",
+        "keyboard_down",
+        "keyboard_up",
+        "keyboard_press",
+        "keyboard_type",
+        "keyboard_insert_text",
+        "goto",
+        "tab_focus",
+    }
+)
+BID_ACTIONS = frozenset(
+    {
+        "fill",
+        "select_option",
+        "click",
+        "dblclick",
+        "hover",
+        "press",
+        "focus",
+        "clear",
+        "upload_file",
+    }
+)
+COORDINATE_ACTIONS = frozenset(
+    {
+        "mouse_move",
+        "mouse_up",
+        "mouse_down",
+        "mouse_click",
+        "mouse_dblclick",
+        "mouse_upload_file",
+    }
+)
+MULTI_BID_ACTIONS = frozenset({"drag_and_drop"})
+MULTI_COORDINATE_ACTIONS = frozenset({"mouse_drag_and_drop"})
 COORDINATE_TO_BID_ACTION_CONVERSION_TABLE = {
     "mouse_move": "hover",
     "mouse_click": "click",
@@ -56,6 +65,10 @@ BID_TO_COORDINATE_ACTION_CONVERSION_TABLE = {
     value: key for key, value in COORDINATE_TO_BID_ACTION_CONVERSION_TABLE.items()
 }
 
+_ACTION_RE = re.compile(r"\b(\w+)\s*\(")
+_BID_RE = re.compile(r'["\'](.*?)["\']')
+_ARGS_RE = re.compile(r"\w+\((.*)\)")
+
 
 @dataclasses.dataclass
 class BrowserGymActionInfo:
@@ -69,6 +82,15 @@ class BrowserGymActionInfo:
     value: list | None = None
 
 
+@functools.lru_cache(maxsize=1)
+def _get_highlevel_action_parser():
+    """
+    Build the BrowserGym high-level action grammar once. Building it is much slower than parsing
+    a short action, and pyparsing parsers keep no state between parses, so it can be shared.
+    """
+    return _build_highlevel_action_parser()
+
+
 def monkey_patch_to_python_code(obs, coordinates_multiplier: float = 1):
     """
     Return a monkey patched python action parser which converts normalized
@@ -87,7 +109,7 @@ def monkey_patch_to_python_code(obs, coordinates_multiplier: float = 1):
             Executable python code that performs the action in a browsergym environment.
         """
         highlevel_code = action
-        local_parser = _build_highlevel_action_parser()
+        local_parser = _get_highlevel_action_parser()
         # do the actual parsing and convert each high-level action to
         # the corresponding python function call
         if self.strict:
@@ -143,6 +165,51 @@ def monkey_patch_to_python_code(obs, coordinates_multiplier: float = 1):
     return to_python_code
 
 
+@functools.lru_cache(maxsize=256)
+def _tags_re(tags: tuple[str, ...]) -> re.Pattern:
+    """
+    Compile one pattern matching the content of any of the tags, so that the text is scanned once
+    for all of them. Each alternative is a lookahead, so that a match does not consume the text and
+    tags nested in another tag are still found, just like searching for each tag separately.
+    """
+    return re.compile(
+        "|".join(rf"(?=<{tag}>(?P<c{i}>.*?)</{tag}>)" for i, tag in enumerate(tags)),
+        re.DOTALL,
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _key_values_re(keys: tuple[str, ...]) -> re.Pattern:
+    """Compile one pattern matching the value of any of the keys, like _tags_re does for tags."""
+    # The key is followed by a colon, and the value runs until the next key or the end of string
+    return re.compile(
+        "|".join(
+            rf"(?={key}\s*:\s*(?P<c{i}>.+?)(?=(?:\n\w+\s*:)|$))"
+            for i, key in enumerate(keys)
+        ),
+        re.DOTALL,
+    )
+
+
+def _first_matches(pattern: re.Pattern, text: str, n: int) -> list[str | None]:
+    """
+    Find the first match of each alternative of a pattern built by _tags_re or _key_values_re.
+
+    Returns:
+        list[str | None]: The matched content of each of the n alternatives, or None if not found.
+    """
+    matches: list[str | None] = [None] * n
+    remaining = n
+    for match in pattern.finditer(text):
+        for i, content in enumerate(match.groups()):
+            if content is not None and matches[i] is None:
+                matches[i] = content
+                remaining -= 1
+        if not remaining:
+            break
+    return matches
+
+
 def extract_content_by_tags(text: str, tags: list[str]) -> dict[str, str | None]:
     """
     Extracts the first occurrence of content inside specified tags and returns a dictionary.
@@ -155,17 +222,9 @@ def extract_content_by_tags(text: str, tags: list[str]) -> dict[str, str | None]
         dict[str, Optional[str]]: A dictionary where keys are tag names,
             and values are the first content string or None if the tag is not found.
     """
-    extracted: dict[str, str | None] = {}
-
-    for tag in tags:
-        # Build a regex pattern dynamically for each tag
-        pattern = rf"<{tag}>(.*?)</{tag}>"
-        # Find the first match for the current tag
-        match = re.search(pattern, text, re.DOTALL)
-        # Assign None if no match, otherwise assign the matched string
-        extracted[tag] = match.group(1) if match else None
-
-    return extracted
+    tags = list(dict.fromkeys(tags))
+    matches = _first_matches(_tags_re(tuple(tags)), text, len(tags))
+    return dict(zip(tags, matches))
 
 
 def extract_key_value_pairs(text: str, keys: list[str]) -> dict[str, str | None]:
@@ -179,13 +238,12 @@ def extract_key_value_pairs(text: str, keys: list[str]) -> dict[str, str | None]
     Returns:
         dict[str, Optional[str]]: A dictionary of extracted key-value pairs.
     """
-    result = {}
-    for key in keys:
-        # Use regex to find the key followed by a colon, then extract the value until the next key or the end of string
-        pattern = rf"{key}\s*:\s*(.+?)(?=(?:\n\w+\s*:)|$)"
-        match = re.search(pattern, text, re.DOTALL)
-        result[key] = match.group(1).strip() if match else None
-    return result
+    keys = list(dict.fromkeys(keys))
+    matches = _first_matches(_key_values_re(tuple(keys)), text, len(keys))
+    return {
+        key: match.strip() if match is not None else None
+        for key, match in zip(keys, matches)
+    }
 
 
 def extract_action(text: str) -> str:
@@ -198,7 +256,7 @@ def extract_action(text: str) -> str:
     Returns:
         str: The action name before `(...)`. Returns an empty string if not found.
     """
-    match = re.search(r"\b(\w+)\s*\(", text)
+    match = _ACTION_RE.search(text)
     return match.group(1) if match else ""
 
 
@@ -212,13 +270,14 @@ def extract_bid(text: str) -> str:
     Returns:
         str: The content inside the first pair of quotes. Returns an empty string if not found.
     """
-    match = re.search(r'["\'](.*?)["\']', text)
+    match = _BID_RE.search(text)
     return match.group(1) if match else ""
 
 
 def extract_info_from_browsergym_action(action_str: str) -> BrowserGymActionInfo:
     """
     Extracts information from a BrowserGym action string.
+    The same actions repeat across trajectories, so parsed actions are cached.
 
     Args:
         action_str (str): The action string to extract information from.
@@ -226,6 +285,22 @@ def extract_info_from_browsergym_action(action_str: str) -> BrowserGymActionInfo
     Returns:
         BrowserGymActionInfo: The extracted information from the action string.
     """
+    info = _extract_info_from_browsergym_action(action_str)
+    # callers may update the returned info, so the cached one is never handed out
+    return BrowserGymActionInfo(
+        action_type=info.action_type,
+        bids=list(info.bids) if info.bids is not None else None,
+        absolute_coordinates=(
+            list(info.absolute_coordinates)
+            if info.absolute_coordinates is not None
+            else None
+        ),
+        value=list(info.value) if info.value is not None else None,
+    )
+
+
+@functools.lru_cache(maxsize=8192)
+def _extract_info_from_browsergym_action(action_str: str) -> BrowserGymActionInfo:
     # Extract the action name
     action_type = extract_action(action_str)
     action_parameters = extract_values_maintain_types(action_str)
@@ -270,6 +345,23 @@ def extract_info_from_browsergym_action(action_str: str) -> BrowserGymActionInfo
     return ret
 
 
+def _literal_value(node: ast.expr):
+    """
+    Evaluate a literal node like ast.literal_eval, reading plain and negated constants directly
+    since almost all action arguments are strings and numbers.
+    """
+    if isinstance(node, ast.Constant):
+        return node.value
+    if (
+        isinstance(node, ast.UnaryOp)
+        and isinstance(node.op, ast.USub)
+        and isinstance(node.operand, ast.Constant)
+        and type(node.operand.value) in (int, float)
+    ):
+        return -node.operand.value
+    return ast.literal_eval(node)
+
+
 def extract_values_maintain_types(string: str) -> list[str | float]:
     """
     Extracts values from a string while maintaining their types.
@@ -281,20 +373,20 @@ def extract_values_maintain_types(string: str) -> list[str | float]:
         list[Any]: A list of extracted values with their correct types.
     """
     # Find the function arguments inside parentheses
-    match = re.search(r"\w+\((.*)\)", string)
+    match = _ARGS_RE.search(string)
     if not match:
         return []
 
     content = match.group(1).strip()
 
     args_list = []
-    # Use ast.parse to safely evaluate arguments
-    tree = ast.parse(f"f({content})").body[0].value
+    # Use ast.parse to safely evaluate arguments, as a single expression
+    tree = ast.parse(f"f({content})", mode="eval").body
     for arg in tree.args:
-        args_list.append(ast.literal_eval(arg))  # Extract positional arguments
+        args_list.append(_literal_value(arg))  # Extract positional arguments
     for kw in tree.keywords:
         args_list.append(
-            ast.literal_eval(kw.value)
+            _literal_value(kw.value)
         )  # Extract keyword arguments, ignoring names
 
     return args_list
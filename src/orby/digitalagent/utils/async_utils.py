@@ -0,0 +1,57 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Coroutine
+
+# Event loop shared by all synchronous callers of run_coroutine, running in a daemon thread
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: threading.Thread | None = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(
+                target=_loop.run_forever, name="orby-async-utils", daemon=True
+            )
+            _loop_thread.start()
+        return _loop
+
+
+def run_coroutine(coroutine: Coroutine) -> Any:
+    """
+    Run a coroutine to completion from synchronous code and return its result.
+
+    Unlike asyncio.run, which creates and closes a new event loop on every call, all coroutines run on
+    a single long-lived event loop in a background thread. Async clients bound to that loop, and their
+    connection pools, are therefore reused across calls instead of being dropped without being closed.
+    It can also be called while another event loop is running in the calling thread, e.g. in a notebook.
+
+    Args:
+        coroutine (Coroutine): The coroutine to run.
+
+    Returns:
+        Any: The result of the coroutine.
+    """
+    loop = _get_loop()
+    if threading.current_thread() is _loop_thread:
+        coroutine.close()
+        raise RuntimeError(
+            "run_coroutine cannot be called from a coroutine running on the shared event loop, await it instead."
+        )
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+async def gather_with_semaphore(
+    coroutine_fn: Callable[[Any], Awaitable], items: list, max_concurrency: int
+) -> list:
+    """Await `coroutine_fn` on all items with at most `max_concurrency` in flight, returning results in order."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(item):
+        async with semaphore:
+            return await coroutine_fn(item)
+
+    return await asyncio.gather(*(_run(item) for item in items))
@@ -325,6 +325,39 @@ def find_element_by_bid(
     return dfs(node)
 
 
+def make_bid_element_map(
+    node: element_pb2.Element, bid_location: str = "attributes"
+) -> dict[str, element_pb2.Element]:
+    """
+    Create a mapping from browsergym_id to element, so that repeated lookups do not
+    need to walk the tree like find_element_by_bid does.
+    If multiple elements share a browsergym_id, the one find_element_by_bid would return is kept.
+
+    Args:
+        node (element_pb2.Element): The root element.
+        bid_location (str): The location of the browsergym_id. Can be
+            - "attributes": we read the bid from node.attributes["bid"]
+            - "id": we read the bid from node.id
+            Default is "attributes".
+
+    Returns:
+        dict[str, element_pb2.Element]: A mapping from browsergym_id to element.
+    """
+    bid_element_map = {}
+
+    def dfs(node: element_pb2.Element):
+        if bid_location == "attributes":
+            bid = node.attributes.get("bid", "")
+        else:
+            bid = node.id
+        bid_element_map.setdefault(bid, node)
+        for child in node.children:
+            dfs(child)
+
+    dfs(node)
+    return bid_element_map
+
+
 def compress_dom(
     root_element: element_pb2.Element,
     orbot_dom_options: dict[str, Any],
@@ -1,4 +1,4 @@
-import base64
+import pybase64
 import concurrent.futures as cf
 import pandas as pd
 import pickle
@@ -116,7 +116,7 @@ def predict_with_mosaic_endpoint(
             image, "JPEG"
         )
     else:
-        request_data["images"] = base64.b64encode(
+        request_data["images"] = pybase64.b64encode(
             convert_image_list_to_pickle_data(images)
         ).decode("utf-8")
 
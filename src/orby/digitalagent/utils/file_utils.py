@@ -1,6 +1,8 @@
+import heapq
 import io
 import os
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 import lzma
 import smart_open
@@ -97,23 +99,46 @@ def open_local(path, mode="r", **kwargs):
         yield f
 
 
-def list_files(path):
+def _list_s3_keys(s3_client, bucket, prefix, suffix="", delimiter=None):
+    """List the keys under an S3 prefix ending with suffix, and the common prefixes if delimiter is set."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    kwargs = {"Delimiter": delimiter} if delimiter else {}
+    keys, common_prefixes = [], []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, **kwargs):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith(suffix):
+                keys.append(obj["Key"])
+        for common_prefix in page.get("CommonPrefixes", []):
+            common_prefixes.append(common_prefix["Prefix"])
+    return keys, common_prefixes
+
+
+def list_files(path, suffix="", max_workers=8):
     """
     Utility function to list all files under a folder recursively.
     Supports both local paths and S3 paths.
+    Only files ending with suffix are returned, e.g. suffix=".pb".
+    On S3, the subfolders of the folder are listed in parallel with max_workers threads,
+    and the files are returned in the same order as a single listing would.
     """
     if path.startswith("s3://"):
         s3_client = boto3.client("s3")
         bucket, prefix = parse_s3_path(path)
-        paginator = s3_client.get_paginator("list_objects_v2")
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            if "Contents" in page:
-                for obj in page["Contents"]:
-                    yield "s3://{}/{}".format(bucket, obj["Key"])
+        keys, subfolders = _list_s3_keys(s3_client, bucket, prefix, suffix, "/")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            subfolder_listings = executor.map(
+                lambda subfolder: _list_s3_keys(s3_client, bucket, subfolder, suffix),
+                subfolders,
+            )
+            subfolder_keys = [keys for keys, _ in subfolder_listings]
+            # S3 lists keys in lexicographic order, merging keeps that order across subfolders
+            for key in heapq.merge(keys, *subfolder_keys):
+                yield "s3://{}/{}".format(bucket, key)
     else:
         for root, _, files in os.walk(path):
             for file in files:
-                yield os.path.join(root, file)
+                if file.endswith(suffix):
+                    yield os.path.join(root, file)
 
 
 if __name__ == "__main__":
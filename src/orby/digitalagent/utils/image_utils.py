@@ -1,7 +1,7 @@
-import base64
 import io
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
+import pybase64
 import random
 import requests
 
@@ -218,6 +218,7 @@ def save_image_bytes_to_file(
 def convert_pil_image_to_base64_str(
     img: Image.Image,
     image_format: str | None = None,
+    **save_kwargs,
 ) -> str:
     """
     Convert a PIL image to a base64-encoded string.
@@ -226,13 +227,18 @@ def convert_pil_image_to_base64_str(
         img (Image.Image): PIL image object
         image_format (str | None): Format of the image (e.g., "JPEG", "PNG") to be saved as.
             If None, the format is inferred from the file extension.
+        **save_kwargs: Options of the image format, e.g. quality=85 for JPEG.
 
     Returns:
         str: Base64-encoded image string
     """
     with io.BytesIO() as f:
-        img.convert("RGB").save(f, image_format)
-        return base64.b64encode(f.getvalue()).decode("utf-8")
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(f, image_format, **save_kwargs)
+        # encode straight from the buffer rather than from a copy of the encoded image
+        with f.getbuffer() as buffer:
+            return pybase64.b64encode(buffer).decode("utf-8")
 
 
 def convert_image_bytes_to_base64_str(
@@ -335,7 +341,7 @@ def numpy_to_base64_bytes(arr):
     img = Image.fromarray(arr, mode="RGB")
     buffered = io.BytesIO()
     img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue())
+    return pybase64.b64encode(buffered.getvalue())
 
 
 def numpy_to_base64(arr):
@@ -344,7 +350,7 @@ def numpy_to_base64(arr):
 
 def base64_to_image(base64_str):
     # Decode base64 string into a PIL Image
-    image_data = base64.b64decode(base64_str)
+    image_data = pybase64.b64decode(base64_str)
 
     # Convert the binary data to a PIL Image
     image = convert_image_bytes_to_pil_image(image_data)
@@ -353,8 +359,8 @@ def base64_to_image(base64_str):
 
 
 def base64_bytes_to_image(base64_bytes):
-    base64_str = base64_bytes.decode("utf-8")
-    return base64_to_image(base64_str)
+    # pybase64 decodes bytes directly, no need to go through str
+    return base64_to_image(base64_bytes)
 
 
 def download_image_as_numpy_array(url):
@@ -366,7 +372,7 @@ def download_image_as_numpy_array(url):
 
 def download_image_as_base64_str(url):
     response = requests.get(url)
-    return base64.b64encode(response.content).decode()
+    return pybase64.b64encode(response.content).decode()
 
 
 def convert_image_bytes_to_numpy(image_bytes: bytes) -> np.ndarray:
@@ -8,7 +8,7 @@ import argparse
 import csv
 import json
 import os
-import base64
+import pybase64
 from concurrent.futures import ProcessPoolExecutor
 from openai import OpenAI
 import instructor
@@ -144,7 +144,7 @@ class SyntheticDataGenerator:
         for url in tqdm(self.generator_config.online_urls):
             try:
                 dom_content, screenshot = self.dom_extractor.extract_dom(url)
-                base64_screenshot = base64.b64encode(screenshot).decode("utf-8")
+                base64_screenshot = pybase64.b64encode(screenshot).decode("utf-8")
 
                 # Generate synthetic data
                 synthetic_data = self.client.chat.completions.create(